@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from services.market_base import Market, Coin
@@ -31,10 +32,10 @@ def test_all_markets():
             log.error(f'get_cup() for {market.name} does not work')
 
         try:
-            best_price = market.get_price(
+            best_price = asyncio.run(market.get_price(
                 coin=btc_coin,
                 base_coin=Market.usdt_coin
-            )
+            ))
             log.info((
                 f'get_price() for {market.name} returned: '
                 f'ask = {best_price.best_ask.number} '
@@ -0,0 +1,184 @@
+"""Сравнение разбора ответов бирж: json + списки CupEntry против
+fast_json + Cup.from_raw (массивы numpy).
+
+Ответы синтезируются в формате каждой биржи, сеть не нужна.
+Запуск из корня репозитория:
+
+    python -m benchmarks.decode
+"""
+from typing import Callable, Dict, List, Tuple
+import io
+import json
+import random
+import sys
+import time
+
+import ijson
+
+from services import fast_json
+from services.cup_side import CupEntry, CupSide
+
+DEPTH = 100
+TOKENS = 8000
+PAIRS = 20000
+
+
+def make_levels(price: float, step: float) -> List[Tuple[float, float]]:
+    return [
+        (round(price + step * i, 6), round(random.uniform(1, 1000), 4))
+        for i in range(DEPTH)
+    ]
+
+
+def as_strings(levels):
+    return [[str(price), str(amount)] for price, amount in levels]
+
+
+def make_book_payloads() -> Dict[str, Tuple[bytes, Callable]]:
+    """биржа -> (ответ, функция, достающая из json пары asks и bids)"""
+    asks = make_levels(1.0, 0.001)
+    bids = make_levels(0.999, -0.001)
+    str_asks = as_strings(asks)
+    str_bids = as_strings(bids)
+    ts = 1650000000
+
+    payloads = {
+        'gate': (
+            {'asks': str_asks, 'bids': str_bids},
+            lambda r: (r['asks'], r['bids'])),
+        'mexc': (
+            {'asks': str_asks, 'bids': str_bids},
+            lambda r: (r['asks'], r['bids'])),
+        'bybit': (
+            {'result': {'asks': str_asks, 'bids': str_bids}},
+            lambda r: (r['result']['asks'], r['result']['bids'])),
+        'kucoin': (
+            {'data': {'asks': str_asks, 'bids': str_bids}},
+            lambda r: (r['data']['asks'], r['data']['bids'])),
+        'lbank': (
+            {'data': {'asks': str_asks, 'bids': str_bids}},
+            lambda r: (r['data']['asks'], r['data']['bids'])),
+        'bitrue': (
+            {'asks': [level + [[]] for level in str_asks],
+             'bids': [level + [[]] for level in str_bids]},
+            lambda r: (r['asks'], r['bids'])),
+        'crypto': (
+            {'result': {'data': [{
+                'asks': [level + ['1'] for level in str_asks],
+                'bids': [level + ['1'] for level in str_bids]}]}},
+            lambda r: (r['result']['data'][0]['asks'],
+                       r['result']['data'][0]['bids'])),
+        'kraken': (
+            {'result': {'XBTUSDT': {
+                'asks': [level + [ts] for level in str_asks],
+                'bids': [level + [ts] for level in str_bids]}}},
+            lambda r: (r['result']['XBTUSDT']['asks'],
+                       r['result']['XBTUSDT']['bids'])),
+        'ftx': (
+            {'success': True, 'result': {'asks': asks, 'bids': bids}},
+            lambda r: (r['result']['asks'], r['result']['bids'])),
+        'bitmart': (
+            {'data': {
+                'sells': [{'price': p, 'amount': a, 'total': a}
+                          for p, a in str_asks],
+                'buys': [{'price': p, 'amount': a, 'total': a}
+                         for p, a in str_bids]}},
+            lambda r: (
+                [(e['price'], e['amount']) for e in r['data']['sells']],
+                [(e['price'], e['amount']) for e in r['data']['buys']])),
+    }
+    return {
+        name: (json.dumps(payload).encode(), extract)
+        for name, (payload, extract) in payloads.items()
+    }
+
+
+def old_book(content: bytes, extract: Callable):
+    asks, bids = extract(json.loads(content))
+    return (
+        [CupEntry(float(entry[0]), float(entry[1])) for entry in asks],
+        [CupEntry(float(entry[0]), float(entry[1])) for entry in bids]
+    )
+
+
+def new_book(content: bytes, extract: Callable):
+    asks, bids = extract(fast_json.loads(content))
+    return CupSide.from_raw(asks), CupSide.from_raw(bids)
+
+
+def make_pancakeswap_tokens() -> bytes:
+    return json.dumps({'updated_at': 1650000000, 'data': {
+        f'0x{i:040x}': {
+            'name': f'Token {i}', 'symbol': f'TKN{i}',
+            'price': str(random.random()),
+            'price_BNB': str(random.random())}
+        for i in range(TOKENS)
+    }}).encode()
+
+
+def make_raydium_pairs() -> bytes:
+    return json.dumps([{
+        'name': f'TKN{i}-USDC', 'ammId': f'amm{i}',
+        'baseMint': f'mint{i}', 'quoteMint': 'usdc',
+        'price': random.random(),
+        'tokenAmountCoin': random.uniform(1, 1e6),
+        'tokenAmountPc': random.uniform(1, 1e6),
+        'volume24h': random.uniform(1, 1e6)}
+        for i in range(PAIRS)
+    ]).encode()
+
+
+def measure(func: Callable, *args, repeat: int = 5) -> float:
+    """лучшее время одного вызова за repeat попыток, sec"""
+    number = 1
+    while True:
+        started_at = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        if time.perf_counter() - started_at > 0.05:
+            break
+        number *= 2
+
+    best = float('inf')
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        best = min(best, (time.perf_counter() - started_at) / number)
+    return best
+
+
+def report(name: str, size: int, old: float, new: float) -> None:
+    print(f'{name:<12} {size / 1024:>8.1f} KB'
+          f' {old * 1e6:>10.1f} us {new * 1e6:>10.1f} us'
+          f' {old / new:>7.1f}x')
+
+
+def main() -> None:
+    random.seed(0)
+    print(f'decoder: {fast_json.decoder_name}, '
+          f'ijson backend: {ijson.backend}, python {sys.version.split()[0]}')
+    print(f'{"market":<12} {"payload":>11} {"old":>13} {"new":>13} '
+          f'{"speedup":>8}')
+
+    for name, (content, extract) in make_book_payloads().items():
+        assert [list(side) for side in new_book(content, extract)] == \
+            list(old_book(content, extract))
+        report(name, len(content),
+               measure(old_book, content, extract),
+               measure(new_book, content, extract))
+
+    tokens = make_pancakeswap_tokens()
+    report('pancakeswap', len(tokens),
+           measure(json.loads, tokens), measure(fast_json.loads, tokens))
+
+    # Raydium разбирается потоково (ijson), чтобы не держать весь список
+    # в памяти: для сравнения - json целиком
+    pairs = make_raydium_pairs()
+    stream = measure(lambda data: list(ijson.items(
+        io.BytesIO(data), 'item', use_float=True)), pairs)
+    report('raydium', len(pairs), measure(json.loads, pairs), stream)
+
+
+if __name__ == '__main__':
+    main()
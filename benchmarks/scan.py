@@ -0,0 +1,329 @@
+"""Бенчмарк поиска цен и сделок без сети: маркеты ходят в локальные
+заглушки бирж (benchmarks/stand_in.py) с заданной задержкой и долей
+отказов. Измеряются задержки p50/p99 и пропускная способность
+get_best_price, find_couple_for_best_deal и полного цикла
+сканирования списка монет. Запуск из корня репозитория:
+
+    python -m benchmarks.scan --latency 0.05 --error-rate 0.02
+
+Результаты пишутся в json (--output), чтобы сравнивать прогоны.
+"""
+from typing import Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import sys
+import time
+
+import numpy as np
+
+from services import fast_json, metrics
+from services.market_base import Coin, CoinNotFound, Market, MarketTimeOut
+from services.rate_limit import TokenBucket
+from services.scanner import Scanner
+from services.api_bitmart import BitMart
+from services.api_bitrue import Bitrue
+from services.api_bybit import ByBit
+from services.api_crypto import Crypto
+from services.api_gate import Gate
+from services.api_huobi import Huobi
+from services.api_jupyter import Jupyter
+from services.api_kraken import Kraken
+from services.api_kucoin import Kucoin
+from services.api_lbank import Lbank
+from services.api_mexc import Mexc
+from services.api_pancakeswap import Pancakeswap
+from services.api_raydium import Raydium
+
+from .stand_in import Book, Faults, StandIn, StandIns
+
+MARKETS = (
+    Gate, Huobi, Mexc, ByBit, Kucoin, Bitrue, Lbank, Crypto, Kraken,
+    BitMart, Jupyter, Pancakeswap, Raydium,
+)
+# результаты запросов в метриках маркета
+RESULTS = (
+    'ok', 'not_found', 'error', 'timeout', 'rate_limited', 'unavailable',
+    'not_sent')
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.scan', description=__doc__.split('\n')[0])
+    parser.add_argument('--coins', type=int, default=20,
+                        help='монет в списке (watchlist)')
+    parser.add_argument('--iterations', type=int, default=50,
+                        help='вызовов get_best_price и find_couple')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='сколько вызовов идет одновременно')
+    parser.add_argument('--cycles', type=int, default=3,
+                        help='циклов сканирования списка монет')
+    parser.add_argument('--coins-in-parallel', type=int, default=10,
+                        help='монет одновременно в цикле сканирования')
+    parser.add_argument('--budget', type=float,
+                        default=Market.timeout_for_reply,
+                        help='budget get_best_price и find_couple, sec '
+                             '(0 - без budget, как в сканере)')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='задержка ответа заглушки, sec')
+    parser.add_argument('--jitter', type=float, default=0.01,
+                        help='средняя случайная добавка к задержке, sec')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='доля ответов 500')
+    parser.add_argument('--timeout-rate', type=float, default=0.0,
+                        help='доля запросов без ответа')
+    parser.add_argument('--spread', type=float, default=0.03,
+                        help='разброс цен между биржами, доля')
+    parser.add_argument('--warm', action='store_true',
+                        help='не чистить кэш стаканов между вызовами')
+    parser.add_argument('--no-rate-limit', action='store_true',
+                        help='без лимитов запросов бирж')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json',
+                        help='куда записать результаты (json)')
+    return parser.parse_args(argv)
+
+
+def make_coins(count: int, rng: random.Random) -> Dict[Coin, float]:
+    """монеты списка и их общие цены, $"""
+    return {
+        Coin(f'tkn{index}', address=f'0x{index:040x}'):
+            10 ** rng.uniform(-4, 4)
+        for index in range(count)
+    }
+
+
+def make_markets(no_rate_limit: bool) -> List[Market]:
+    markets = []
+    for market_class in MARKETS:
+        market = market_class()
+        # только REST: потоки стаканов заглушками не поддерживаются
+        market.stream = None
+        if no_rate_limit:
+            market.rate_limiter = TokenBucket(rate=1e9, burst=1e9)
+        markets.append(market)
+    return markets
+
+
+def summarize(durations: List[float], wall_time: float) -> dict:
+    """задержки в ms и пропускная способность (вызовов в секунду)"""
+    if not durations:
+        return {'count': 0}
+    values = np.array(durations) * 1e3
+    return {
+        'count': len(durations),
+        'throughput': round(len(durations) / wall_time, 2),
+        'mean_ms': round(float(values.mean()), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p90_ms': round(float(np.percentile(values, 90)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(values.max()), 2),
+    }
+
+
+async def measure_calls(
+        call: Callable[[Coin], Awaitable],
+        coins: List[Coin],
+        args: argparse.Namespace) -> dict:
+    """iterations вызовов call по монетам списка по кругу,
+    не больше concurrency одновременно
+    """
+    durations = []
+    outcomes = dict.fromkeys(
+        ('found', 'partial', 'not_found', 'timeout', 'error'), 0)
+    # исключение -> сколько раз вызов им закончился
+    errors: Dict[str, int] = {}
+    requests_before = metrics.request_seconds.get_count()
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < args.iterations:
+            coin = coins[next_index % len(coins)]
+            next_index += 1
+            if not args.warm:
+                Market.cup_cache.clear()
+            started_at = time.perf_counter()
+            try:
+                result = await call(coin)
+            except CoinNotFound:
+                outcome = 'not_found'
+            except MarketTimeOut:
+                outcome = 'timeout'
+            except Exception as e:
+                outcome = 'error'
+                errors[type(e).__name__] = errors.get(
+                    type(e).__name__, 0) + 1
+            else:
+                if result is None:
+                    outcome = 'not_found'
+                elif result.partial:
+                    outcome = 'partial'
+                else:
+                    outcome = 'found'
+            durations.append(time.perf_counter() - started_at)
+            outcomes[outcome] += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    wall_time = time.perf_counter() - started_at
+    return {
+        **summarize(durations, wall_time),
+        'outcomes': outcomes,
+        'errors': errors,
+        'requests': metrics.request_seconds.get_count() - requests_before,
+    }
+
+
+async def measure_scan(coins: List[Coin], args: argparse.Namespace) -> dict:
+    """cycles полных циклов сканера по всему списку монет"""
+    checks = []
+
+    async def check(coin: Coin) -> bool:
+        started_at = time.perf_counter()
+        try:
+            return bool(await Market.find_couple_for_best_deal(coin))
+        finally:
+            checks.append(time.perf_counter() - started_at)
+
+    scanner = Scanner(
+        check=check,
+        coins_in_parallel=args.coins_in_parallel,
+        max_coins_per_tick=len(coins))
+    cycles = []
+    requests = []
+    for _ in range(args.cycles):
+        if not args.warm:
+            Market.cup_cache.clear()
+        started_at = time.perf_counter()
+        await scanner.run_cycle(coins)
+        cycles.append(time.perf_counter() - started_at)
+        requests.append(scanner.stats.last_requests)
+
+    return {
+        'cycles': summarize(cycles, sum(cycles)),
+        'coins': summarize(checks, sum(cycles)),
+        'requests_per_cycle': requests,
+        'errors': scanner.stats.errors,
+    }
+
+
+def collect_market_stats(markets: List[Market]) -> Dict[str, dict]:
+    """метрики запросов маркетов за весь прогон"""
+    stats = {}
+    for market in markets:
+        latency = {
+            f'p{int(quantile * 100)}_ms': round(
+                metrics.request_seconds.get_quantile(
+                    quantile, market=market.name) * 1e3, 2)
+            for quantile in (0.5, 0.99)
+        }
+        stats[market.name] = {
+            'requests': metrics.request_seconds.get_count(
+                market=market.name),
+            # оценки по корзинам гистограммы (как в Prometheus)
+            **latency,
+            'results': {
+                result: int(metrics.requests_total.get(
+                    market=market.name, result=result))
+                for result in RESULTS
+            },
+            'http_requests': int(
+                metrics.http_requests_total.get(market=market.name)),
+            'response_bytes': int(
+                metrics.response_bytes_total.get(market=market.name)),
+            'rate_limit_wait': round(
+                market.rate_limiter.stats.total_wait, 3),
+            'breaker_opens': market.breaker.opens,
+        }
+    return stats
+
+
+def report(name: str, result: dict) -> None:
+    if not result.get('count'):
+        print(f'{name:<28} no calls')
+        return
+    print(f'{name:<28} {result["count"]:>6} {result["throughput"]:>9.1f}/s'
+          f' {result["p50_ms"]:>9.1f} ms {result["p99_ms"]:>9.1f} ms')
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    coin_prices = make_coins(args.coins, rng)
+    coins = list(coin_prices)
+    prices = {coin.get_name(): price for coin, price in coin_prices.items()}
+
+    markets = make_markets(args.no_rate_limit)
+    faults = Faults(
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, timeout_rate=args.timeout_rate)
+    stand_ins = StandIns([
+        StandIn(Book(market, coins, prices, args.spread, rng),
+                random.Random(rng.random()))
+        for market in markets
+    ])
+    stand_ins.start()
+    try:
+        await Market.refresh_catalogues()
+        for market in markets:
+            if isinstance(market, Raydium):
+                # список пар грузится в фоне: ждем, чтобы не мерить загрузку
+                market.pairs.start()
+                await asyncio.get_running_loop().run_in_executor(
+                    None, market.pairs.loaded.wait, 30)
+        stand_ins.set_faults(faults)
+
+        budget = args.budget or None
+        scenarios = {
+            'get_best_price': await measure_calls(
+                lambda coin: Market.get_best_price(coin, budget=budget),
+                coins, args),
+            'find_couple_for_best_deal': await measure_calls(
+                lambda coin: Market.find_couple_for_best_deal(
+                    coin, budget=budget),
+                coins, args),
+            'watchlist_scan': await measure_scan(coins, args),
+        }
+    finally:
+        stand_ins.stop()
+
+    return {
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'decoder': fast_json.decoder_name,
+        'config': vars(args),
+        'scenarios': scenarios,
+        'markets': collect_market_stats(markets),
+        'stand_ins': stand_ins.get_stats(),
+    }
+
+
+def main(argv: List[str] = None) -> None:
+    args = parse_args(argv)
+    # логи каждого запроса мешают мерить
+    logging.getLogger('business_logic').setLevel(logging.ERROR)
+
+    results = asyncio.run(run(args))
+
+    print(f'{len(MARKETS)} markets, {args.coins} coins, '
+          f'latency {args.latency * 1e3:.0f}+{args.jitter * 1e3:.0f} ms, '
+          f'errors {args.error_rate:.0%}, timeouts {args.timeout_rate:.0%}')
+    print(f'{"scenario":<28} {"calls":>6} {"throughput":>11}'
+          f' {"p50":>12} {"p99":>12}')
+    scenarios = results['scenarios']
+    report('get_best_price', scenarios['get_best_price'])
+    report('find_couple_for_best_deal',
+           scenarios['find_couple_for_best_deal'])
+    report('scan: coin', scenarios['watchlist_scan']['coins'])
+    report('scan: cycle', scenarios['watchlist_scan']['cycles'])
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'results are written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
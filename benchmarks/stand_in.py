@@ -0,0 +1,539 @@
+"""Локальные биржи-заглушки для бенчмарков: http серверы, которые
+отвечают стаканами, тикерами и списками пар в формате каждой биржи.
+
+Цены синтезируются из seed, так что прогоны воспроизводимы.
+Задержка ответа и доля отказов (500 или ответа нет вовсе)
+задаются через Faults. Запросы маркетов переводятся на заглушки
+через Market.http.redirect (см. StandIns.start).
+
+Нет заглушек для 1inch (токены грузятся при создании маркета, еще до
+перевода на заглушку) и FTX (запросы собираются через session.send) -
+в бенчмарк они не входят.
+"""
+from typing import Callable, Dict, List, NamedTuple, Tuple
+import asyncio
+import json
+import random
+import threading
+
+from aiohttp import web
+
+from services.market_base import Coin, Market
+
+Levels = List[List[str]]
+# обработчик пути: запрос -> json ответа. KeyError - нет такой пары
+Route = Callable[[web.Request], object]
+
+
+class Faults(NamedTuple):
+    """что портит ответы заглушки"""
+    latency: float = 0.0  # задержка ответа, sec
+    jitter: float = 0.0  # случайная добавка к задержке, sec (в среднем)
+    error_rate: float = 0.0  # доля ответов 500
+    timeout_rate: float = 0.0  # доля запросов, которые висят без ответа
+    hang: float = 30.0  # сколько висит запрос без ответа, sec
+
+
+class Pair(NamedTuple):
+    coin: Coin
+    quote: Coin
+    symbol: str  # имя пары в api биржи
+    mid: float  # середина спреда
+
+
+class Book:
+    """пары и стаканы одной биржи"""
+    depth = 100
+    # шаг цены между записями стакана, доля от цены
+    tick = 0.001
+
+    def __init__(
+            self, market: Market,
+            coins: List[Coin],
+            prices: Dict[str, float],
+            spread: float,
+            rng: random.Random) -> None:
+        """
+        Args:
+            market (Market): биржа, в формате которой отдаются пары
+            coins (List[Coin]): монеты биржи
+            prices (Dict[str, float]): имя монеты -> общая цена, $
+            spread (float): насколько цена биржи отличается от общей, доля
+            rng (random.Random): генератор цен
+        """
+        self.market = market
+        # без usd, если биржа торгует и к стейблкоинам
+        quotes = [
+            quote for quote in market.base_coins
+            if quote is not Market.usd_coin] or list(market.base_coins)
+        self.pairs: Dict[str, Pair] = {}
+        for coin in coins:
+            for quote in quotes:
+                symbol = market.make_name_for_market(coin, quote)
+                mid = prices[coin.get_name()] * (
+                    1 + rng.uniform(-spread, spread))
+                self.pairs[symbol] = Pair(coin, quote, symbol, mid)
+        self._seed = rng.random()
+        self._levels: Dict[str, Tuple[Levels, Levels]] = {}
+
+    def get_levels(
+            self, symbol: str,
+            limit: int = None) -> Tuple[Levels, Levels]:
+        """asks и bids пары, цены и объемы строками
+
+        Raises:
+            KeyError: такой пары нет
+        """
+        if symbol not in self._levels:
+            pair = self.pairs[symbol]
+            rng = random.Random(f'{self._seed}/{symbol}')
+            step = pair.mid * self.tick
+            # объем записи - от 50 до 2000 $
+            self._levels[symbol] = tuple(
+                [[f'{pair.mid + sign * step * (index + 1):.8g}',
+                  f'{rng.uniform(50, 2000) / pair.mid:.6g}']
+                 for index in range(self.depth)]
+                for sign in (1, -1))
+        asks, bids = self._levels[symbol]
+        return asks[:limit], bids[:limit]
+
+    def get_ticker(self, pair: Pair) -> Tuple[str, str]:
+        """лучшие ask и bid пары"""
+        asks, bids = self.get_levels(pair.symbol, 1)
+        return asks[0][0], bids[0][0]
+
+
+def get_limit(request: web.Request, name: str) -> int:
+    return int(request.query.get(name, Book.depth))
+
+
+def make_gate_routes(book: Book) -> Dict[str, Route]:
+    def order_book(request):
+        asks, bids = book.get_levels(
+            request.query['currency_pair'], get_limit(request, 'limit'))
+        return {'asks': asks, 'bids': bids}
+
+    def tickers(request):
+        return [
+            dict(zip(('currency_pair', 'lowest_ask', 'highest_bid'),
+                     (pair.symbol, *book.get_ticker(pair))))
+            for pair in book.pairs.values()]
+
+    def currency_pairs(request):
+        return [
+            {'id': pair.symbol, 'base': pair.coin.get_upper_name(),
+             'quote': pair.quote.get_upper_name(),
+             'trade_status': 'tradable'}
+            for pair in book.pairs.values()]
+
+    return {
+        '/api/v4/spot/order_book': order_book,
+        '/api/v4/spot/tickers': tickers,
+        '/api/v4/spot/currency_pairs': currency_pairs,
+    }
+
+
+def make_book_tickers(book: Book) -> Route:
+    """тикеры в формате binance: symbol, askPrice, bidPrice"""
+    def book_tickers(request):
+        return [
+            dict(zip(('symbol', 'askPrice', 'bidPrice'),
+                     (pair.symbol, *book.get_ticker(pair))))
+            for pair in book.pairs.values()]
+    return book_tickers
+
+
+def make_mexc_routes(book: Book) -> Dict[str, Route]:
+    def depth(request):
+        asks, bids = book.get_levels(
+            request.query['symbol'], get_limit(request, 'limit'))
+        return {'asks': asks, 'bids': bids}
+
+    def exchange_info(request):
+        return {'symbols': [
+            {'symbol': pair.symbol, 'baseAsset': pair.coin.get_upper_name(),
+             'quoteAsset': pair.quote.get_upper_name(), 'status': 'ENABLED'}
+            for pair in book.pairs.values()]}
+
+    return {
+        '/api/v3/depth': depth,
+        '/api/v3/ticker/bookTicker': make_book_tickers(book),
+        '/api/v3/exchangeInfo': exchange_info,
+    }
+
+
+def make_bybit_routes(book: Book) -> Dict[str, Route]:
+    def depth(request):
+        asks, bids = book.get_levels(
+            request.query['symbol'], get_limit(request, 'limit'))
+        return {'result': {'asks': asks, 'bids': bids}}
+
+    def book_ticker(request):
+        return {'result': make_book_tickers(book)(request)}
+
+    def symbols(request):
+        return {'result': [
+            {'name': pair.symbol,
+             'baseCurrency': pair.coin.get_upper_name(),
+             'quoteCurrency': pair.quote.get_upper_name(),
+             'showStatus': True}
+            for pair in book.pairs.values()]}
+
+    return {
+        '/spot/quote/v1/depth': depth,
+        '/spot/quote/v1/ticker/book_ticker': book_ticker,
+        '/spot/v1/symbols': symbols,
+    }
+
+
+def make_kucoin_routes(book: Book) -> Dict[str, Route]:
+    def level2_20(request):
+        asks, bids = book.get_levels(request.query['symbol'], 20)
+        return {'data': {'asks': asks, 'bids': bids}}
+
+    def all_tickers(request):
+        return {'data': {'ticker': [
+            dict(zip(('symbol', 'sell', 'buy'),
+                     (pair.symbol, *book.get_ticker(pair))))
+            for pair in book.pairs.values()]}}
+
+    def symbols(request):
+        return {'data': [
+            {'symbol': pair.symbol,
+             'baseCurrency': pair.coin.get_upper_name(),
+             'quoteCurrency': pair.quote.get_upper_name(),
+             'enableTrading': True}
+            for pair in book.pairs.values()]}
+
+    return {
+        '/api/v1/market/orderbook/level2_20': level2_20,
+        '/api/v1/market/allTickers': all_tickers,
+        '/api/v1/symbols': symbols,
+    }
+
+
+def make_bitrue_routes(book: Book) -> Dict[str, Route]:
+    def depth(request):
+        asks, bids = book.get_levels(
+            request.query['symbol'], get_limit(request, 'limit'))
+        # записи bitrue - [цена, объем, []]
+        return {'asks': [entry + [[]] for entry in asks],
+                'bids': [entry + [[]] for entry in bids]}
+
+    def exchange_info(request):
+        return {'symbols': [
+            {'symbol': pair.symbol.lower(), 'baseAsset': pair.coin.name,
+             'quoteAsset': pair.quote.name, 'status': 'TRADING'}
+            for pair in book.pairs.values()]}
+
+    return {
+        '/api/v1/depth': depth,
+        '/api/v1/ticker/bookTicker': make_book_tickers(book),
+        '/api/v1/exchangeInfo': exchange_info,
+    }
+
+
+def make_lbank_routes(book: Book) -> Dict[str, Route]:
+    def depth(request):
+        asks, bids = book.get_levels(
+            request.query['symbol'], get_limit(request, 'size'))
+        return {'data': {'asks': asks, 'bids': bids}}
+
+    def currency_pairs(request):
+        return {'data': list(book.pairs)}
+
+    return {
+        '/v2/depth.do': depth,
+        '/v2/currencyPairs.do': currency_pairs,
+    }
+
+
+def make_crypto_routes(book: Book) -> Dict[str, Route]:
+    def get_book(request):
+        asks, bids = book.get_levels(
+            request.query['instrument_name'], get_limit(request, 'depth'))
+        # записи crypto.com - [цена, объем, число ордеров]
+        return {'result': {'data': [
+            {'asks': [entry + ['1'] for entry in asks],
+             'bids': [entry + ['1'] for entry in bids]}]}}
+
+    def get_ticker(request):
+        return {'result': {'data': [
+            dict(zip(('i', 'k', 'b'), (pair.symbol, *book.get_ticker(pair))))
+            for pair in book.pairs.values()]}}
+
+    def get_instruments(request):
+        return {'result': {'instruments': [
+            {'instrument_name': pair.symbol,
+             'base_currency': pair.coin.get_upper_name(),
+             'quote_currency': pair.quote.get_upper_name()}
+            for pair in book.pairs.values()]}}
+
+    return {
+        '/v2/public/get-book': get_book,
+        '/v2/public/get-ticker': get_ticker,
+        '/v2/public/get-instruments': get_instruments,
+    }
+
+
+def make_kraken_routes(book: Book) -> Dict[str, Route]:
+    def depth(request):
+        symbol = request.query['pair']
+        asks, bids = book.get_levels(symbol, get_limit(request, 'count'))
+        # записи kraken - [цена, объем, время]
+        return {'result': {symbol: {
+            'asks': [entry + [1650000000] for entry in asks],
+            'bids': [entry + [1650000000] for entry in bids]}}}
+
+    def asset_pairs(request):
+        return {'result': {
+            pair.symbol: {
+                'altname': pair.symbol,
+                'wsname': f'{pair.coin.get_upper_name()}/'
+                          f'{pair.quote.get_upper_name()}',
+                'status': 'online'}
+            for pair in book.pairs.values()}}
+
+    return {
+        '/0/public/Depth': depth,
+        '/0/public/AssetPairs': asset_pairs,
+    }
+
+
+def make_bitmart_routes(book: Book) -> Dict[str, Route]:
+    def symbols_book(request):
+        asks, bids = book.get_levels(
+            request.query['symbol'], get_limit(request, 'size'))
+        return {'data': {
+            'sells': [{'price': price, 'amount': amount}
+                      for price, amount in asks],
+            'buys': [{'price': price, 'amount': amount}
+                     for price, amount in bids]}}
+
+    def ticker(request):
+        return {'data': {'tickers': [
+            dict(zip(('symbol', 'best_ask', 'best_bid'),
+                     (pair.symbol, *book.get_ticker(pair))))
+            for pair in book.pairs.values()]}}
+
+    def symbols_details(request):
+        return {'data': {'symbols': [
+            {'symbol': pair.symbol,
+             'base_currency': pair.coin.get_upper_name(),
+             'quote_currency': pair.quote.get_upper_name(),
+             'trade_status': 'trading'}
+            for pair in book.pairs.values()]}}
+
+    return {
+        '/spot/v1/symbols/book': symbols_book,
+        '/spot/v1/ticker': ticker,
+        '/spot/v1/symbols/details': symbols_details,
+    }
+
+
+def make_jupyter_routes(book: Book) -> Dict[str, Route]:
+    def price(request):
+        symbol = f"{request.query['id']}/{request.query['vsToken']}"
+        return {'data': {'price': book.pairs[symbol].mid}}
+
+    return {'/v1/price': price}
+
+
+def make_pancakeswap_routes(book: Book) -> Dict[str, Route]:
+    by_address = {
+        pair.coin.get_address(): pair for pair in book.pairs.values()}
+
+    def tokens(request):
+        return {'data': {
+            address: {'symbol': pair.coin.get_upper_name(),
+                      'price': str(pair.mid)}
+            for address, pair in by_address.items()}}
+
+    def token(request):
+        pair = by_address[request.match_info['address']]
+        return {'data': {'price': str(pair.mid)}}
+
+    return {
+        '/api/v2/tokens': tokens,
+        '/api/v2/tokens/{address}': token,
+    }
+
+
+def make_raydium_routes(book: Book) -> Dict[str, Route]:
+    def pairs(request):
+        # в пуле монет на 5000-50000 $
+        rng = random.Random(len(book.pairs))
+        return [
+            {'name': pair.symbol, 'baseMint': pair.coin.get_address(),
+             'price': pair.mid,
+             'tokenAmountCoin': amount / pair.mid,
+             'tokenAmountPc': amount}
+            for pair, amount in (
+                (pair, rng.uniform(5000, 50000))
+                for pair in book.pairs.values())]
+
+    return {'/v2/main/pairs': pairs}
+
+
+def make_huobi_routes(book: Book) -> Dict[str, Route]:
+    def depth(request):
+        asks, bids = book.get_levels(
+            request.query['symbol'], get_limit(request, 'depth'))
+        return {'status': 'ok', 'tick': {'asks': asks, 'bids': bids}}
+
+    def tickers(request):
+        return {'status': 'ok', 'data': [
+            dict(zip(('symbol', 'ask', 'bid'),
+                     (pair.symbol, *map(float, book.get_ticker(pair)))))
+            for pair in book.pairs.values()]}
+
+    def symbols(request):
+        return {'status': 'ok', 'data': [
+            {'symbol': pair.symbol, 'base-currency': pair.coin.get_name(),
+             'quote-currency': pair.quote.get_name(), 'state': 'online'}
+            for pair in book.pairs.values()]}
+
+    return {
+        '/market/depth': depth,
+        '/market/tickers': tickers,
+        '/v1/common/symbols': symbols,
+    }
+
+
+# класс маркета -> (хост api биржи, маршруты заглушки)
+EXCHANGES: Dict[str, Tuple[str, Callable[[Book], Dict[str, Route]]]] = {
+    'Gate': ('api.gateio.ws', make_gate_routes),
+    'Huobi': ('api.huobi.pro', make_huobi_routes),
+    'Mexc': ('api.mexc.com', make_mexc_routes),
+    'ByBit': ('api.bybit.com', make_bybit_routes),
+    'Kucoin': ('api.kucoin.com', make_kucoin_routes),
+    'Bitrue': ('openapi.bitrue.com', make_bitrue_routes),
+    'Lbank': ('api.lbank.info', make_lbank_routes),
+    'Crypto': ('api.crypto.com', make_crypto_routes),
+    'Kraken': ('api.kraken.com', make_kraken_routes),
+    'BitMart': ('api-cloud.bitmart.com', make_bitmart_routes),
+    'Jupyter': ('quote-api.jup.ag', make_jupyter_routes),
+    'Pancakeswap': ('api.pancakeswap.info', make_pancakeswap_routes),
+    'Raydium': ('api.raydium.io', make_raydium_routes),
+}
+
+
+class StandIn:
+    """http сервер вместо одной биржи"""
+
+    def __init__(self, book: Book, rng: random.Random) -> None:
+        self.book = book
+        # отказы включаются после загрузки списков пар (StandIns.set_faults)
+        self.faults = Faults()
+        self.host, make_routes = EXCHANGES[type(book.market).__name__]
+        self.routes = make_routes(book)
+        self.rng = rng
+        self.requests = 0
+        self.errors = 0  # ответов 500
+        self.hangs = 0  # запросов без ответа
+        self.port: int = None
+        # ответы не меняются: json собирается один раз
+        self._bodies: Dict[str, bytes] = {}
+
+    def make_handler(self, route: Route):
+        async def handle(request: web.Request) -> web.Response:
+            self.requests += 1
+            delay = self.faults.latency
+            if self.faults.jitter:
+                delay += self.rng.expovariate(1 / self.faults.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            chance = self.rng.random()
+            if chance < self.faults.timeout_rate:
+                self.hangs += 1
+                await asyncio.sleep(self.faults.hang)
+            elif chance < self.faults.timeout_rate + self.faults.error_rate:
+                self.errors += 1
+                return web.json_response(
+                    {'code': 500, 'msg': 'injected failure'}, status=500)
+
+            body = self._bodies.get(request.path_qs)
+            if body is None:
+                try:
+                    payload = route(request)
+                except (KeyError, ValueError):
+                    return web.json_response(
+                        {'code': 400, 'msg': 'invalid symbol'}, status=400)
+                body = json.dumps(payload).encode()
+                self._bodies[request.path_qs] = body
+            return web.Response(body=body, content_type='application/json')
+        return handle
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        for path, route in self.routes.items():
+            app.router.add_get(path, self.make_handler(route))
+        return app
+
+
+class StandIns:
+    """Заглушки всех бирж в отдельном потоке со своим event loop,
+    чтобы ответы заглушек не занимали loop, который измеряется
+    """
+
+    def __init__(self, stand_ins: List[StandIn]) -> None:
+        self.stand_ins = stand_ins
+        self._loop: asyncio.AbstractEventLoop = None
+        self._runners: List[web.AppRunner] = []
+        self._started = threading.Event()
+
+    def start(self) -> None:
+        """запускает серверы и переводит на них запросы маркетов"""
+        threading.Thread(
+            target=self._serve, name='stand-ins', daemon=True).start()
+        self._started.wait()
+        for stand_in in self.stand_ins:
+            Market.http.redirect(
+                stand_in.host, f'http://127.0.0.1:{stand_in.port}')
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start_servers())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _start_servers(self) -> None:
+        for stand_in in self.stand_ins:
+            runner = web.AppRunner(stand_in.make_app(), access_log=None)
+            await runner.setup()
+            await web.TCPSite(
+                runner, '127.0.0.1', 0, shutdown_timeout=0.1).start()
+            stand_in.port = runner.addresses[0][1]
+            self._runners.append(runner)
+
+    def set_faults(self, faults: Faults) -> None:
+        for stand_in in self.stand_ins:
+            stand_in.faults = faults
+
+    async def _stop_servers(self) -> None:
+        for runner in self._runners:
+            await runner.cleanup()
+        # запросы, которые висят без ответа
+        tasks = [
+            task for task in asyncio.all_tasks()
+            if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        for stand_in in self.stand_ins:
+            Market.http.redirects.pop(stand_in.host, None)
+        asyncio.run_coroutine_threadsafe(
+            self._stop_servers(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {
+            stand_in.book.market.name: {
+                'requests': stand_in.requests,
+                'errors': stand_in.errors,
+                'hangs': stand_in.hangs,
+            }
+            for stand_in in self.stand_ins
+        }
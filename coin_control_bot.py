@@ -1,4 +1,5 @@
 from __future__ import annotations
+import html
 import logging
 import typing
 
@@ -15,11 +16,15 @@ from aiogram.types.message import ContentType
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers import cron
+from apscheduler.events import EVENT_JOB_MISSED, JobExecutionEvent
 
 # Import modules of this project
-from config import ADMINS_TG, API_TOKEN
+from config import ADMINS_TG, API_TOKEN, METRICS_PORT
+from services import metrics
+from services.circuit_breaker import CircuitBreaker
 from services.market_base import BestPrice, Coin, CoinNotFound, \
-    Market, MarketTimeOut
+    Market, MarketTimeOut, MarketUnavailable
+from services.scanner import Scanner
 import services.api_config
 
 
@@ -140,7 +145,11 @@ async def start_command(message: Message, state: FSMContext):
     log.info('adding job')
     scheduler.add_job(
         func=check_all_coins,
-        trigger=trigger
+        trigger=trigger,
+        # тик во время идущего цикла должен дойти до scanner,
+        # который объединит его с повторным циклом и посчитает
+        max_instances=2,
+        coalesce=True
     )
     await message.answer(text='Запущен поиск сделок')
 
@@ -169,6 +178,79 @@ async def restart_command(message: Message, state: FSMContext):
     await start_command(message, state)
 
 
+def make_market_state(market: Market) -> str:
+    """состояние автомата биржи для админов"""
+    breaker = market.breaker
+    if breaker.state == CircuitBreaker.CLOSED:
+        text = (
+            f'работает, неудачных запросов '
+            f'{breaker.get_failure_ratio():.0%}')
+    elif breaker.state == CircuitBreaker.HALF_OPEN:
+        text = '<i>проверяется</i>'
+    else:
+        text = (
+            f'<b>отключена</b>, проверка через '
+            f'{breaker.get_retry_in():.0f} сек')
+    if breaker.opens:
+        text += (
+            f', отключалась {breaker.opens} раз, '
+            f'последняя ошибка: {html.escape(breaker.last_error)}')
+    return text
+
+
+@dp.message_handler(
+    lambda message: is_message_private(message),
+    commands=['markets'], state="*")
+async def markets_command(message: Message, state: FSMContext):
+    log.info('markets command from: %r', message.from_user.id)
+    if not await user_from_white_list(message):
+        return
+    text = '<b>Биржи:</b>\n'
+    for market in Market.all_markets:
+        text += f'{market.name} - {make_market_state(market)}\n'
+    await message.answer(text=text)
+
+
+def make_market_stats(market: Market) -> str:
+    """задержки и результаты запросов к бирже для админов"""
+    name = market.name
+    count = metrics.request_seconds.get_count(market=name)
+    if not count:
+        return f'{name} - запросов не было'
+    p50 = metrics.request_seconds.get_quantile(0.5, market=name)
+    p99 = metrics.request_seconds.get_quantile(0.99, market=name)
+    timeouts = metrics.requests_total.get(market=name, result='timeout')
+    errors = metrics.requests_total.get(market=name, result='error')
+    not_found = metrics.prices_total.get(market=name, result='not_found')
+    megabytes = metrics.response_bytes_total.get(market=name) / 2 ** 20
+    return (
+        f'{name} - {count} запр., p50 {p50:.2f} / p99 {p99:.2f} сек, '
+        f'таймаутов {timeouts:.0f}, ошибок {errors:.0f}, '
+        f'не найдено {not_found:.0f}, {megabytes:.1f} МБ')
+
+
+@dp.message_handler(
+    lambda message: is_message_private(message),
+    commands=['stats'], state="*")
+async def stats_command(message: Message, state: FSMContext):
+    log.info('stats command from: %r', message.from_user.id)
+    if not await user_from_white_list(message):
+        return
+    text = (
+        f'<b>Сканер:</b> циклов {scanner.stats.cycles}, '
+        f'последний {scanner.stats.last_duration:.1f} сек, '
+        f'{scanner.stats.last_requests} запр., '
+        f'ошибок {scanner.stats.errors}\n'
+        f'наложений тиков {scanner.stats.overruns}, '
+        f'пропущено тиков {scanner.stats.missed}, '
+        f'монет в очереди {scanner.stats.backlog}\n\n'
+        f'<b>Биржи:</b>\n'
+    )
+    for market in Market.all_markets:
+        text += f'{make_market_stats(market)}\n'
+    await message.answer(text=text)
+
+
 def make_keyboard_with_coins() -> ReplyKeyboardMarkup:
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     coin_names = [coin.get_upper_name() for coin in Coin.get_all_coins()]
@@ -237,24 +319,17 @@ async def callback_all_prices(
 
     text = f'<b>{coin.get_upper_name()}</b>\n'
     for market in Market.all_markets:
-        text_price = None
-        time_is_out = False
-        for base_coin in Market.base_coins:
-            try:
-                price = market.get_price(coin, base_coin).best_ask
-                text_price = f'{price.number} {price.base_coin.get_name()}'
-                break
-            except CoinNotFound:
-                continue
-            except MarketTimeOut:
-                time_is_out = True
-                continue
-
-        if not text_price:
-            if time_is_out:
-                text_price = '<i>timeout</i>'
-            else:
-                text_price = '<i>not_found</i>'
+        try:
+            # цены только в тех базовых монетах, что есть на бирже
+            prices = await market.get_prices(coin)
+            price = prices[0].best_ask
+            text_price = f'{price.number} {price.base_coin.get_name()}'
+        except CoinNotFound:
+            text_price = '<i>not_found</i>'
+        except MarketUnavailable:
+            text_price = '<i>unavailable</i>'
+        except MarketTimeOut:
+            text_price = '<i>timeout</i>'
         text += f'{market.name} - {text_price}\n'
         await query.message.edit_text(
             text=text
@@ -291,6 +366,15 @@ def make_message_for_best_price(best_prices: BestPrice) -> str:
         f' - {best_prices.best_bid.number}'
         f' {best_prices.best_bid.base_coin.get_name()}\n'
     )
+    if best_prices.max_size:
+        text += f'объем до {round(best_prices.max_size)}$\n'
+    if best_prices.partial:
+        text += '\n<i>Неполный ответ'
+        if best_prices.late_markets:
+            text += (
+                f', не успели ответить: '
+                f'{", ".join(best_prices.late_markets)}')
+        text += '</i>\n'
     return text
 
 
@@ -309,10 +393,14 @@ async def callback_best_prices(
         return
 
     try:
-        best_prices = Market.get_best_price(coin)
+        best_prices = await Market.get_best_price(
+            coin, budget=Market.timeout_for_reply)
     except CoinNotFound:
         await query.message.edit_text('Монета не найдена ни на одной бирже')
         return
+    except MarketTimeOut:
+        await query.message.edit_text('Биржи не успели ответить')
+        return
 
     text = (
         f'Лучшие цены, доступные сейчас\n'
@@ -336,18 +424,26 @@ async def callback_find_deal(
         return
 
     try:
-        best_prices = await Market.find_couple_for_best_deal(coin)
+        best_prices = await Market.find_couple_for_best_deal(
+            coin, budget=Market.timeout_for_reply)
     except CoinNotFound:
         await query.message.edit_text(
             'Монета не найдена ни на одной бирже')
         return
+    except MarketTimeOut:
+        await query.message.edit_text('Биржи не успели ответить')
+        return
     if not best_prices:
         await query.message.edit_text(
             'Сейчас нет хорошего варианта для сделки')
         return
 
+    if best_prices.max_size:
+        title = 'Лучший вариант сделки, доступный сейчас'
+    else:
+        title = 'Лучший вариант сделки, объем не успели проверить'
     text = (
-        f'Лучший вариант сделки, доступный сейчас\n\n'
+        f'{title}\n\n'
         f'{make_message_for_best_price(best_prices)}'
     )
     await query.message.edit_text(text=text)
@@ -535,42 +631,74 @@ async def new_text(message: Message, state: FSMContext):
 
 
 #  ----------------------------------------------------- ДЕЙСТВИЯ ПО РАСПИСАНИЮ
-next_coin_index = 0
-
-
 async def check_all_coins():
     """начинает поиск сделки для всех монет"""
     log.info('check_all_coins is starting')
-    global next_coin_index
-    if next_coin_index >= len(Coin.get_all_coins()):
-        next_coin_index = 0
-    await find_couple_for_best_deal(
-        coin=Coin.get_all_coins()[next_coin_index]
-    )
-    next_coin_index += 1
-
+    await scanner.tick(Coin.get_all_coins)
     log.info('check_all_coins ended')
 
 
-async def find_couple_for_best_deal(coin: Coin):
+async def find_couple_for_best_deal(coin: Coin) -> bool:
+    """ищет сделку по монете и сообщает о ней админам
+
+    Returns:
+        bool: найден вариант для сделки
+    """
     try:
         best_prices = await Market.find_couple_for_best_deal(coin)
     except CoinNotFound:
         await send_message_to_admins(
             f'Монета {coin.get_upper_name()} не найдена ни на одной бирже',
             disable_notification=True)
-        return
+        return False
     if not best_prices:
         log.info(f"{coin.get_upper_name()} - couple for deal wasn't found")
-        return
+        return False
 
     text = (
         f'Найден вариант для сделки\n\n'
         f'{make_message_for_best_price(best_prices)}'
     )
     await send_message_to_admins(text)
+    return True
+
+
+scanner = Scanner(
+    check=find_couple_for_best_deal,
+    coins_in_parallel=10,
+    max_coins_per_tick=20
+)
+
+
+def count_missed_job(event: JobExecutionEvent):
+    scanner.count_missed()
+    log.warning('scheduled scan was missed: %r', event.scheduled_run_time)
+
+
+scheduler.add_listener(count_missed_job, EVENT_JOB_MISSED)
+
+
+metrics_server = None
+
+
+async def on_startup(dp: Dispatcher):
+    global metrics_server
+    # метрики отдаются только локально
+    metrics_server = await metrics.start_server(port=METRICS_PORT)
+    # списки пар бирж: дальше обновляются раз в сутки сами
+    await Market.refresh_catalogues()
+
+
+async def on_shutdown(dp: Dispatcher):
+    await Market.stop_streams()
+    if metrics_server is not None:
+        await metrics_server.cleanup()
+    # изменения монет сохраняются в базу пачками, дописываем остаток
+    Coin.flush_changes()
 
 
 if __name__ == '__main__':
     scheduler.start()
-    executor.start_polling(dp, skip_updates=False)
+    executor.start_polling(
+        dp, skip_updates=False,
+        on_startup=on_startup, on_shutdown=on_shutdown)
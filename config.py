@@ -1,3 +1,6 @@
 API_TOKEN = ''
 
 ADMINS_TG = [98244574, ]
+
+# метрики в формате Prometheus: http://127.0.0.1:METRICS_PORT/metrics
+METRICS_PORT = 9108
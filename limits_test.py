@@ -0,0 +1,222 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import time
+
+from services.api_gate import Gate
+from services.circuit_breaker import CircuitBreaker
+from services.deadline import Deadline
+from services.market_base import Coin, Cup, Market, MarketTimeOut, \
+    RequestNotSent
+from services.rate_limit import TokenBucket
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger('limits_test')
+
+
+def check(ok: bool, message: str) -> None:
+    if ok:
+        log.info(message)
+    else:
+        log.error(f'FAILED: {message}')
+
+
+async def test_token_bucket():
+    print('------')
+    bucket = TokenBucket(rate=10, burst=5)
+    started_at = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire()
+    check(time.monotonic() - started_at < 0.05,
+          'burst passes without waiting')
+
+    check(abs(bucket.get_wait() - 0.1) < 0.02,
+          'next request waits for one token')
+    check(not await bucket.acquire(max_wait=0.05),
+          'request that would wait past max_wait is rejected')
+    check(bucket.stats.rejected == 1 and bucket.tokens < 0.1,
+          'rejected request takes no tokens')
+
+    started_at = time.monotonic()
+    await asyncio.gather(bucket.acquire(), bucket.acquire())
+    duration = time.monotonic() - started_at
+    check(0.15 < duration < 0.3,
+          f'queued requests wait in turn: {duration:.2f} sec')
+    check(bucket.stats.delayed == 2, 'waiting requests are counted')
+
+
+async def test_heavy_request():
+    print('------')
+    # вес больше запаса: без ограничения веса ждал бы вечно
+    bucket = TokenBucket(rate=20, burst=20)
+    check(await bucket.acquire(weight=40, max_wait=0.9),
+          'request heavier than burst passes a full bucket')
+    check(abs(bucket.get_wait(weight=40) - 1.0) < 0.05,
+          'heavy request waits for a full bucket only')
+    check(await bucket.acquire(weight=40, max_wait=1.1),
+          'heavy request passes after the bucket refills')
+
+
+async def test_pause():
+    print('------')
+    bucket = TokenBucket(rate=100, burst=100)
+    bucket.pause(0.2)
+    check(bucket.get_wait() > 0.15, 'pause delays requests')
+    check(not await bucket.acquire(max_wait=0.1),
+          'pause longer than max_wait rejects requests')
+    check(bucket.stats.throttled == 1, 'pause is counted')
+
+
+def test_circuit_breaker():
+    print('------')
+    breaker = CircuitBreaker(
+        window=10, min_calls=4, failure_ratio=0.5, open_for=0.1)
+    for _ in range(2):
+        breaker.record_success()
+    breaker.record_failure('timeout')
+    check(breaker.state == CircuitBreaker.CLOSED,
+          'too few calls do not open the breaker')
+    breaker.record_failure('timeout')
+    check(breaker.state == CircuitBreaker.OPEN and breaker.opens == 1,
+          'half of failures opens the breaker')
+    check(not breaker.allow() and breaker.rejected == 1,
+          'open breaker rejects requests')
+
+    time.sleep(0.11)
+    check(breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN,
+          'half open breaker lets a trial request through')
+    check(not breaker.allow(), 'only one trial request at a time')
+    breaker.record_ignored()
+    check(breaker.allow(), 'ignored trial can be sent again')
+
+    breaker.record_failure('timeout')
+    check(breaker.state == CircuitBreaker.OPEN and
+          0.15 < breaker.get_retry_in() <= 0.2,
+          'failed trial opens the breaker for twice as long')
+
+    time.sleep(0.21)
+    breaker.allow()
+    breaker.record_success()
+    check(breaker.state == CircuitBreaker.CLOSED and
+          breaker.get_failure_ratio() == 0,
+          'successful trial closes the breaker')
+
+
+async def test_request_deadline():
+    print('------')
+    market = Gate()
+    market.stream = None
+    # один поток: второй запрос ждет, пока первый его освободит
+    market._executor = ThreadPoolExecutor(max_workers=1)
+
+    def slow_request(seconds: float) -> float:
+        time.sleep(seconds)
+        return seconds
+
+    first = asyncio.ensure_future(market.run_with_deadline(
+        None, slow_request, 0.5, timeout=1))
+    await asyncio.sleep(0.05)
+    try:
+        await market.run_with_deadline(
+            Deadline(0.2), slow_request, 0.1)
+        check(False, 'request without a thread is not sent')
+    except RequestNotSent:
+        check(not market.breaker.get_failure_ratio(),
+              'request without a thread is not a failure')
+
+    # ждет поток 0.25 сек, а timeout 0.6 считается с его получения
+    started_at = time.monotonic()
+    result = await market.run_with_deadline(
+        Deadline(2), slow_request, 0.5, timeout=0.6)
+    check(result == 0.5 and time.monotonic() - started_at > 0.7,
+          'timeout starts when the request gets a thread')
+    await first
+
+    try:
+        await market.run_with_deadline(
+            None, slow_request, 0.8, timeout=0.5)
+        check(False, 'slow request times out')
+    except RequestNotSent:
+        check(False, 'slow request was sent')
+    except MarketTimeOut:
+        check(market.breaker.get_failure_ratio() > 0,
+              'timeout of a sent request is a failure')
+
+    market._executor.shutdown()
+    Market.all_markets.remove(market)
+
+
+class LocalGate(Gate):
+    """gate без снимка тикеров и списка пар: цены только из стаканов"""
+    has_tickers = False
+    has_catalogue = False
+    cup_calls = 0
+
+    def get_cup(self, coin, base_coin, depth=1):
+        self.cup_calls += 1
+        return Cup.from_raw([['101', '1']], [['99', '1']])
+
+
+async def test_unsent_request():
+    print('------')
+    market = LocalGate()
+    market.stream = None
+    coin = Coin(name='limits_test_coin')
+    try:
+        await market.get_price(coin, Market.usdt_coin, Deadline(0))
+        check(False, 'request after the deadline is not sent')
+    except RequestNotSent:
+        check(market.cup_calls == 0,
+              'request after the deadline is not sent')
+
+    try:
+        await market.get_price(coin, Market.usdt_coin, Deadline(5))
+        check(market.cup_calls == 1,
+              'unsent request does not mark the pair as timed out')
+    except MarketTimeOut:
+        check(False, 'unsent request marks the pair as timed out')
+    Market.all_markets.remove(market)
+
+
+async def test_answered_requests():
+    print('------')
+    market = LocalGate()
+    market.stream = None
+    market.breaker = CircuitBreaker(min_calls=1, open_for=0)
+
+    def local_miss():
+        raise KeyError('coin is not in the index')
+
+    def bad_answer():
+        Market.mark_answered()
+        raise KeyError('asks')
+
+    def from_memory():
+        return 1
+
+    for func, closes in (
+            (local_miss, False), (from_memory, False), (bad_answer, True)):
+        market.breaker.record_failure('timeout')
+        try:
+            await market.run_with_deadline(None, func)
+        except KeyError:
+            pass
+        closed = market.breaker.state == CircuitBreaker.CLOSED
+        check(closed == closes,
+              f'{func.__name__}: breaker is {market.breaker.state}')
+    Market.all_markets.remove(market)
+
+
+async def test_limits():
+    await test_token_bucket()
+    await test_heavy_request()
+    await test_pause()
+    test_circuit_breaker()
+    await test_request_deadline()
+    await test_unsent_request()
+    await test_answered_requests()
+
+
+if __name__ == '__main__':
+    asyncio.run(test_limits())
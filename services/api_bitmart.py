@@ -1,33 +1,57 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class BitMart(Market):
+    has_tickers = True
+    has_catalogue = True
+    # публичные запросы стакана: 5 за секунду
+    requests_per_second = 5
+    rate_burst = 5
 
     def __init__(self) -> None:
         super().__init__('bitmart')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}_{base_coin.get_upper_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'symbol': symbol, 'size': depth}
-        resp = requests.get('https://api-cloud.bitmart.com'
-                            '/spot/v1/symbols/book', params=payload)
+        rjson = self.http_get_json(
+            'https://api-cloud.bitmart.com'
+            '/spot/v1/symbols/book', params=payload)['data']
         # ---------------------------------------------------------------------
-        rjson = resp.json()['data']
         asks_json = rjson['sells']
         bids_json = rjson['buys']
 
-        asks = [CupEntry(float(entry['price']), float(entry['amount']))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry['price']), float(entry['amount']))
-                for entry in bids_json]
-
-        return Cup(asks, bids)
-
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+        return Cup.from_raw(
+            [(entry['price'], entry['amount']) for entry in asks_json],
+            [(entry['price'], entry['amount']) for entry in bids_json]
+        )
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json(
+            'https://api-cloud.bitmart.com/spot/v1/ticker')
+        return {
+            entry['symbol']: Ticker.from_raw(
+                ask=entry['best_ask'], bid=entry['best_bid'])
+            for entry in rjson['data']['tickers']
+        }
+
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json(
+            'https://api-cloud.bitmart.com'
+            '/spot/v1/symbols/details')
+        return [
+            (entry['base_currency'], entry['quote_currency'], PairInfo(
+                symbol=entry['symbol'],
+                listed=entry['trade_status'] == 'trading'))
+            for entry in rjson['data']['symbols']
+        ]
+
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = self.make_name_for_market(coin, base_coin)
 
         return f'https://www.bitmart.com/trade/' \
@@ -1,31 +1,49 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class Bitrue(Market):
+    has_tickers = True
+    has_catalogue = True
 
     def __init__(self) -> None:
         super().__init__('bitrue')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}{base_coin.get_upper_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'symbol': symbol, 'limit': depth}
-        resp = requests.get('https://openapi.bitrue.com/api/v1/depth',
-                            params=payload)
-
-        bids_json = resp.json()['bids']
-        asks_json = resp.json()['asks']
-
-        asks = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in bids_json]
-
-        return Cup(asks, bids)
-
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+        rjson = self.http_get_json(
+            'https://openapi.bitrue.com/api/v1/depth', params=payload)
+
+        bids_json = rjson['bids']
+        asks_json = rjson['asks']
+
+        return Cup.from_raw(asks_json, bids_json)
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json(
+            'https://openapi.bitrue.com'
+            '/api/v1/ticker/bookTicker')
+        return {
+            entry['symbol']: Ticker.from_raw(
+                ask=entry['askPrice'], bid=entry['bidPrice'])
+            for entry in rjson
+        }
+
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json(
+            'https://openapi.bitrue.com/api/v1/exchangeInfo')
+        return [
+            (entry['baseAsset'], entry['quoteAsset'], PairInfo(
+                symbol=entry['symbol'].upper(),
+                listed=entry['status'] == 'TRADING'))
+            for entry in rjson['symbols']
+        ]
+
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = f'{coin.get_name(self)}_{base_coin.get_name()}'
         return f'https://www.bitrue.com/trade/{market_name}'
@@ -1,31 +1,87 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo, log
+from .order_book import LocalOrderBook, SequenceGap
 
 
 class ByBit(Market):
+    has_tickers = True
+    has_catalogue = True
+    # стакан приходит снимком, дальше только изменения
+    stream_url = 'wss://stream.bybit.com/v5/public/spot'
+    # спот отдает 1, 50 или 200 записей: 50 не хватает на проверку глубины
+    stream_depth = 200
 
     def __init__(self) -> None:
         super().__init__('bybit')
+        self.books: Dict[str, LocalOrderBook] = {}
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}{base_coin.get_upper_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'symbol': symbol, 'limit': depth}
-        resp = requests.get('https://api.bybit.com/spot/quote/v1/depth',
-                            params=payload)
-        rjson = resp.json()['result']
+        rjson = self.http_get_json(
+            'https://api.bybit.com/spot/quote/v1/depth',
+            params=payload)['result']
         asks_json = rjson['asks']
         bids_json = rjson['bids']
 
-        asks = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in bids_json]
+        return Cup.from_raw(asks_json, bids_json)
+
+    def make_subscribe_message(self, symbol: str) -> dict:
+        return {'op': 'subscribe',
+                'args': [f'orderbook.{self.stream_depth}.{symbol}']}
+
+    def make_unsubscribe_message(self, symbol: str) -> dict:
+        return {'op': 'unsubscribe',
+                'args': [f'orderbook.{self.stream_depth}.{symbol}']}
+
+    def make_stream_ping(self) -> dict:
+        return {'op': 'ping'}
+
+    def parse_stream_message(self, data) -> Iterable[Tuple[str, Cup]]:
+        if not data.get('topic', '').startswith('orderbook.'):
+            return []
+        # a/b - измененные записи, u - номер обновления
+        book_data = data['data']
+        symbol = book_data['s']
+        book = self.books.setdefault(symbol, LocalOrderBook())
+        if data['type'] == 'snapshot':
+            book.apply_snapshot(book_data['a'], book_data['b'], book_data['u'])
+        elif not book.synced:
+            # после переподписки ждем новый снимок
+            return []
+        else:
+            try:
+                book.apply_delta(
+                    book_data['a'], book_data['b'], book_data['u'])
+            except SequenceGap as e:
+                log.warning(f'{self.name} {symbol} book is out of sync: {e}')
+                self.stream.resubscribe(symbol)
+                return []
+        return [(symbol, book.get_cup(self.stream_depth))]
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json(
+            'https://api.bybit.com'
+            '/spot/quote/v1/ticker/book_ticker')
+        return {
+            entry['symbol']: Ticker.from_raw(
+                ask=entry['askPrice'], bid=entry['bidPrice'])
+            for entry in rjson['result']
+        }
 
-        return Cup(asks, bids)
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json('https://api.bybit.com/spot/v1/symbols')
+        return [
+            (entry['baseCurrency'], entry['quoteCurrency'], PairInfo(
+                symbol=entry['name'],
+                listed=entry.get('showStatus', True)))
+            for entry in rjson['result']
+        ]
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = f'{coin.get_upper_name()}/{base_coin.get_upper_name()}'
         return f'https://www.bybit.com/en-US/trade/spot/{market_name}'
@@ -1,13 +1,18 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class Crypto(Market):
+    has_tickers = True
+    has_catalogue = True
+    requests_per_second = 20
+    rate_burst = 20
 
     def __init__(self) -> None:
         super().__init__('crypto')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}_{base_coin.get_upper_name()}'
 
     # параметр depth не срабатывает, поэтому entries обрезаются уже на выходе
@@ -17,18 +22,33 @@ class Crypto(Market):
             depth = 10
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'instrument_name': symbol, 'depth': str(depth)}
-        resp = requests.get('https://api.crypto.com/v2/public/get-book',
-                            params=payload)
-
-        rjson = resp.json()['result']['data'][0]
+        rjson = self.http_get_json(
+            'https://api.crypto.com/v2/public/get-book',
+            params=payload)['result']['data'][0]
         asks_json = rjson['asks']
         bids_json = rjson['bids']
 
-        asks = [CupEntry(float(entry[0]), float(entry[1])) for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1])) for entry in bids_json]
-
-        return Cup(asks[0:depth], bids[0:depth])
-
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+        return Cup.from_raw(asks_json, bids_json, depth)
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json(
+            'https://api.crypto.com/v2/public/get-ticker')
+        # i - инструмент, k - лучшая цена продажи, b - лучшая цена покупки
+        return {
+            entry['i']: Ticker.from_raw(ask=entry['k'], bid=entry['b'])
+            for entry in rjson['result']['data']
+        }
+
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json(
+            'https://api.crypto.com'
+            '/v2/public/get-instruments')
+        return [
+            (entry['base_currency'], entry['quote_currency'], PairInfo(
+                symbol=entry['instrument_name']))
+            for entry in rjson['result']['instruments']
+        ]
+
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = self.make_name_for_market(coin, base_coin)
         return f'https://crypto.com/exchange/trade/spot/{market_name}'
@@ -1,19 +1,23 @@
 import time
 import urllib.parse
 from typing import Optional, Dict, Any, List
-from requests import Request, Session, Response
+from requests import Request, Response
 import hmac
 
-from .market_base import Market, Coin, Cup, CupEntry
+from . import fast_json
+from .market_base import Market, Coin, Cup
 
 
 class Ftx(Market):
+    # usdc на FTX зачисляется как usd
+    base_coins = (Market.usd_coin, Market.usdt_coin)
+    requests_per_second = 30
+    rate_burst = 30
     _ENDPOINT = 'https://ftx.com/api/'
 
     def __init__(
             self, api_key=None, api_secret=None, subaccount_name=None) -> None:
         super().__init__('FTX')
-        self._session = Session()
         self._api_key = api_key
         self._api_secret = api_secret
         self._subaccount_name = subaccount_name
@@ -30,7 +34,9 @@ class Ftx(Market):
     def _request(self, method: str, path: str, **kwargs) -> Any:
         request = Request(method, self._ENDPOINT + path, **kwargs)
         self._sign_request(request)
-        response = self._session.send(request.prepare())
+        response = self.http.session.send(
+            request.prepare(), timeout=self.get_request_timeout())
+        self.mark_answered()
         return self._process_response(response)
 
     def _sign_request(self, request: Request) -> None:
@@ -51,7 +57,7 @@ class Ftx(Market):
 
     def _process_response(self, response: Response) -> Any:
         try:
-            data = response.json()
+            data = fast_json.loads(response.content)
         except ValueError:
             response.raise_for_status()
             raise
@@ -72,7 +78,7 @@ class Ftx(Market):
     def get_orderbook(self, market: str, depth: int = None) -> dict:
         return self._get(f'markets/{market}/orderbook', {'depth': depth})
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}/{base_coin.get_upper_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
@@ -81,11 +87,8 @@ class Ftx(Market):
             market=symbol,
             depth=depth
         )
-        asks = [CupEntry(entry[0], entry[1]) for entry in depth['asks']]
-        bids = [CupEntry(entry[0], entry[1]) for entry in depth['bids']]
+        return Cup.from_raw(depth['asks'], depth['bids'])
 
-        return Cup(asks, bids)
-
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = f'{coin.get_upper_name()}/{base_coin.get_upper_name()}'
         return f'https://ftx.com/trade/{market_name}'
@@ -1,32 +1,71 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+import time
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class Gate(Market):
+    has_tickers = True
+    has_catalogue = True
+    stream_url = 'wss://api.gateio.ws/ws/v4/'
+    # самый глубокий снимок потока: его хватает на проверку глубины
+    stream_depth = 100
+    # публичные запросы: 900 за секунду на IP, с запасом
+    requests_per_second = 20
+    rate_burst = 20
 
     def __init__(self) -> None:
         super().__init__('gate')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}_{base_coin.get_upper_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'currency_pair': symbol, 'limit': depth}
-        resp = requests.get('https://api.gateio.ws/api/v4/spot/order_book',
-                            params=payload)
+        rjson = self.http_get_json(
+            'https://api.gateio.ws/api/v4/spot/order_book', params=payload)
 
-        rjson = resp.json()
         asks_json = rjson['asks']
         bids_json = rjson['bids']
 
-        asks = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in bids_json]
+        return Cup.from_raw(asks_json, bids_json)
+
+    def make_subscribe_message(self, symbol: str) -> dict:
+        return {
+            'time': int(time.time()),
+            'channel': 'spot.order_book',
+            'event': 'subscribe',
+            'payload': [symbol, str(self.stream_depth), '100ms']
+        }
+
+    def parse_stream_message(self, data) -> Iterable[Tuple[str, Cup]]:
+        if (data.get('channel') != 'spot.order_book'
+                or data.get('event') != 'update'):
+            return []
+        # каждое сообщение - снимок stream_depth лучших записей
+        book = data['result']
+        return [(book['s'], Cup.from_raw(book['asks'], book['bids']))]
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json('https://api.gateio.ws/api/v4/spot/tickers')
+        return {
+            entry['currency_pair']: Ticker.from_raw(
+                ask=entry['lowest_ask'], bid=entry['highest_bid'])
+            for entry in rjson
+        }
 
-        return Cup(asks, bids)
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json(
+            'https://api.gateio.ws'
+            '/api/v4/spot/currency_pairs')
+        return [
+            (entry['base'], entry['quote'], PairInfo(
+                symbol=entry['id'],
+                listed=entry['trade_status'] == 'tradable'))
+            for entry in rjson
+        ]
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = self.make_name_for_market(coin, base_coin)
         return f'https://www.gate.io/trade/{market_name}'
@@ -1,28 +1,74 @@
-from huobi.client.market import MarketClient
+from typing import Dict, Iterable, Optional, Tuple
+import gzip
 
-from .market_base import Market, Coin, Cup, CupEntry
+from . import fast_json
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class Huobi(Market):
+    has_tickers = True
+    has_catalogue = True
+    stream_url = 'wss://api.huobi.pro/ws'
+    # depth.step0 присылает 150 записей
+    stream_depth = 150
 
     def __init__(self) -> None:
         super().__init__('Huobi')
-        self.market_client = MarketClient()
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_name(self)}{base_coin.get_name(self)}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
-        depth = self.market_client.get_pricedepth(
-            symbol=symbol,
-            depth_size=depth,
-            depth_type='step0')
-        asks = [CupEntry(entry.price, entry.amount) for entry in depth.asks]
-        bids = [CupEntry(entry.price, entry.amount) for entry in depth.bids]
+        payload = {'symbol': symbol, 'type': 'step0'}
+        # depth можно запросить только 5, 10 или 20, без него - 150 записей
+        for size in (5, 10, 20):
+            if depth <= size:
+                payload['depth'] = size
+                break
+        rjson = self.http_get_json(
+            'https://api.huobi.pro/market/depth', params=payload)['tick']
+        asks_json = rjson['asks']
+        bids_json = rjson['bids']
+        return Cup.from_raw(asks_json, bids_json, depth)
 
-        return Cup(asks, bids)
+    def decode_stream_message(self, raw):
+        # все сообщения Huobi сжаты gzip
+        return fast_json.loads(gzip.decompress(raw))
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def make_stream_reply(self, data) -> Optional[dict]:
+        if 'ping' in data:
+            return {'pong': data['ping']}
+        return None
+
+    def make_subscribe_message(self, symbol: str) -> dict:
+        return {'sub': f'market.{symbol}.depth.step0', 'id': symbol}
+
+    def parse_stream_message(self, data) -> Iterable[Tuple[str, Cup]]:
+        if 'tick' not in data or 'ch' not in data:
+            return []
+        # ch: market.btcusdt.depth.step0
+        symbol = data['ch'].split('.')[1]
+        tick = data['tick']
+        return [(symbol, Cup.from_raw(tick['asks'], tick['bids']))]
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json('https://api.huobi.pro/market/tickers')
+        return {
+            entry['symbol']: Ticker.from_raw(
+                ask=entry['ask'], bid=entry['bid'])
+            for entry in rjson['data']
+        }
+
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json('https://api.huobi.pro/v1/common/symbols')
+        return [
+            (entry['base-currency'], entry['quote-currency'], PairInfo(
+                symbol=entry['symbol'],
+                listed=entry['state'] == 'online'))
+            for entry in rjson['data']
+        ]
+
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = f'{coin.get_name(self)}_{base_coin.get_name(self)}'
         return f'https://www.huobi.com/exchange/{market_name}'
@@ -1,13 +1,16 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class Kucoin(Market):
+    has_tickers = True
+    has_catalogue = True
 
     def __init__(self) -> None:
         super().__init__('kucoin')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}-{base_coin.get_upper_name()}'
 
     # можно запросить только depth=20 или depth=100 ->
@@ -17,20 +20,35 @@ class Kucoin(Market):
             depth = 20
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'symbol': symbol}
-        resp = requests.get('https://api.kucoin.com/api/v1/market'
-                            '/orderbook/level2_20', params=payload)
+        rjson = self.http_get_json(
+            'https://api.kucoin.com/api/v1/market'
+            '/orderbook/level2_20', params=payload)['data']
         # ---------------------------------------------------------------------
-        rjson = resp.json()['data']
         asks_json = rjson['asks']
         bids_json = rjson['bids']
 
-        asks = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in bids_json]
-
-        return Cup(asks[0:depth], bids[0:depth])
-
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+        return Cup.from_raw(asks_json, bids_json, depth)
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json(
+            'https://api.kucoin.com'
+            '/api/v1/market/allTickers')
+        # sell - лучшая цена продажи (ask), buy - лучшая цена покупки (bid)
+        return {
+            entry['symbol']: Ticker.from_raw(
+                ask=entry['sell'], bid=entry['buy'])
+            for entry in rjson['data']['ticker']
+        }
+
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json('https://api.kucoin.com/api/v1/symbols')
+        return [
+            (entry['baseCurrency'], entry['quoteCurrency'], PairInfo(
+                symbol=entry['symbol'],
+                listed=entry['enableTrading']))
+            for entry in rjson['data']
+        ]
+
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = self.make_name_for_market(coin, base_coin)
         return f'https://www.kucoin.com/ru/trade/{market_name}'
@@ -1,33 +1,38 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, PairInfo
 
 
 class Lbank(Market):
+    has_catalogue = True
 
     def __init__(self) -> None:
         super().__init__('lbank')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_name(self)}_{base_coin.get_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'symbol': symbol, 'size': depth}
-        resp = requests.get('https://api.lbank.info/v2/depth.do',
-                            params=payload)
-
-        rjson = resp.json()['data']
+        rjson = self.http_get_json(
+            'https://api.lbank.info/v2/depth.do', params=payload)['data']
 
         bids_json = rjson['bids']
         asks_json = rjson['asks']
 
-        asks = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in bids_json]
+        return Cup.from_raw(asks_json, bids_json)
 
-        return Cup(asks, bids)
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json(
+            'https://api.lbank.info/v2/currencyPairs.do')
+        # пары приходят строками вида 'btc_usdt'
+        return [
+            (*symbol.split('_', 1), PairInfo(symbol=symbol))
+            for symbol in rjson['data']
+            if '_' in symbol
+        ]
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = f'{coin.get_name(self)}/{base_coin.get_name()}'
         return f'https://www.lbank.info/exchange/{market_name}'
@@ -1,33 +1,53 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry
+from typing import Dict, Iterable, Tuple
+
+from .market_base import Market, Coin, Cup, Ticker, PairInfo
 
 
 class Mexc(Market):
+    has_tickers = True
+    has_catalogue = True
+    # вес запроса стакана 1, тикеров всех пар - 40:
+    # запас должен вмещать запрос тикеров целиком
+    requests_per_second = 20
+    rate_burst = 40
+    list_request_weight = 40
 
     def __init__(self) -> None:
         super().__init__('mexc')
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}{base_coin.get_upper_name()}'
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         symbol = self.make_name_for_market(coin, base_coin)
         payload = {'symbol': symbol, 'limit': depth}
-        resp = requests.get('https://api.mexc.com/api/v3/depth',
-                            params=payload)
+        rjson = self.http_get_json(
+            'https://api.mexc.com/api/v3/depth', params=payload)
         # ---------------------------------------------------------------------
-        rjson = resp.json()
         asks_json = rjson['asks']
         bids_json = rjson['bids']
 
-        asks = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in asks_json]
-        bids = [CupEntry(float(entry[0]), float(entry[1]))
-                for entry in bids_json]
-
-        return Cup(asks, bids)
-
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+        return Cup.from_raw(asks_json, bids_json)
+
+    def get_tickers(self) -> Dict[str, Ticker]:
+        rjson = self.http_get_json(
+            'https://api.mexc.com/api/v3/ticker/bookTicker')
+        return {
+            entry['symbol']: Ticker.from_raw(
+                ask=entry['askPrice'], bid=entry['bidPrice'])
+            for entry in rjson
+        }
+
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        rjson = self.http_get_json('https://api.mexc.com/api/v3/exchangeInfo')
+        return [
+            (entry['baseAsset'], entry['quoteAsset'], PairInfo(
+                symbol=entry['symbol'],
+                listed=str(entry['status']) in ('ENABLED', '1')))
+            for entry in rjson['symbols']
+        ]
+
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = \
             f'{coin.get_upper_name(self)}_{base_coin.get_upper_name()}'
         return f'https://www.mexc.com/exchange/{market_name}'
@@ -1,29 +1,69 @@
-import requests
+from decimal import Decimal
 import json
+
 from python_1inch import OneInchExchange
+import requests
 
-from .market_base import Market, Coin, Cup, CupEntry
+from . import fast_json
+from .market_base import Market, Coin, Cup, CupEntry, MarketTimeOut, log
 
 
 class Oneinch(Market):
+    # у токенов сети нет usd
+    base_coins = (Market.usdt_coin, Market.usdc_coin)
+    requests_per_second = 2
+    rate_burst = 2
 
     def __init__(self) -> None:
         super().__init__('1inch')
+        # из sdk берутся адреса api и токенов, запросы идут через self.http
         self.exchange = OneInchExchange(address=None)
-        self.exchange.get_tokens()
+        self.load_tokens()
+
+    def make_api_url(self, endpoint: str) -> str:
+        return '{}/{}/{}/{}'.format(
+            self.exchange.base_url,
+            self.exchange.version,
+            self.exchange.chain_id,
+            endpoint)
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def load_tokens(self) -> None:
+        """токены сети: символ -> адрес и decimals"""
+        try:
+            resp = self.http_get(
+                self.make_api_url('tokens'),
+                timeout=self.timeout_for_catalogue)
+            tokens = fast_json.loads(resp.content)['tokens']
+        except (requests.RequestException, MarketTimeOut,
+                ValueError, KeyError) as e:
+            log.error(f'tokens of {self.name} are not loaded: {e!r}')
+            return
+        for address, token in tokens.items():
+            self.exchange.tokens_by_address[address] = token
+            self.exchange.tokens[token['symbol']] = token
+
+    def probe(self) -> None:
+        # без загруженных токенов get_cup падает, не спросив биржу
+        self.http_get(self.make_api_url('tokens'), stream=True).close()
+
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_name(self)}/{base_coin.get_name()}'
 
     def _get_price_quote(
             self, from_token_symbol: str,
             to_token_symbol: str,
             amount: int) -> tuple:
-        quote_dict = self.exchange.get_quote(
-            from_token_symbol=from_token_symbol,
-            to_token_symbol=to_token_symbol,
-            amount=amount
-        )
+        tokens = self.exchange.tokens
+        decimals = tokens[from_token_symbol]['decimals']
+        payload = {
+            'fromTokenAddress': tokens[from_token_symbol]['address'],
+            'toTokenAddress': tokens[to_token_symbol]['address'],
+            'amount': format(
+                Decimal(10 ** decimals * amount).quantize(Decimal('1.')),
+                'n')
+        }
+        quote_dict = self.http_get_json(
+            self.make_api_url('quote'), params=payload)
         toTokenAmount = self.exchange.convert_amount_to_decimal(
             token_symbol=to_token_symbol,
             amount=quote_dict['toTokenAmount']
@@ -35,15 +75,12 @@ class Oneinch(Market):
         return (fromTokenAmount, toTokenAmount)
 
     def _add_coin_to_tokenbook(self, coin: Coin):
-        url = '{}/{}/{}/quote'.format(
-            self.exchange.base_url,
-            self.exchange.version,
-            self.exchange.chain_id)
+        url = self.make_api_url('quote')
         url = url + '?fromTokenAddress={}&toTokenAddress={}&amount={}'.format(
             coin.address,
             self.exchange.tokens['USDT']['address'],
             10_000_000_000_000_000)
-        response = requests.get(url)
+        response = self.http_get(url)
         token = json.loads(response.text)['fromToken']
         coin.put_new_name(
             name=token['symbol'],
@@ -62,7 +99,7 @@ class Oneinch(Market):
             amount=target_base_amount
         )
         ask_price = base_amount / coin_amount
-        asks = [CupEntry(float(ask_price), float(coin_amount)), ]
+        asks = [CupEntry(ask_price, coin_amount), ]
 
         coin_amount_int = int(coin_amount)
         coin_amount, base_amount = self._get_price_quote(
@@ -71,10 +108,10 @@ class Oneinch(Market):
             amount=coin_amount_int
         )
         bid_price = base_amount / coin_amount
-        bids = [CupEntry(float(bid_price), float(coin_amount)), ]
-        return Cup(asks, bids)
+        bids = [CupEntry(bid_price, coin_amount), ]
+        return Cup.from_raw(asks, bids)
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         market_name = \
             f'{coin.get_upper_name(self)}/{base_coin.get_upper_name(self)}'
         return f'https://app.1inch.io/#/1/classic/swap/{market_name}'
@@ -1,42 +1,137 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry, CoinNotFound
+from typing import Dict
+import json
+import os
+import threading
+import time
+
+from . import fast_json
+from .market_base import Market, Coin, Cup, CupEntry, CoinNotFound, \
+    MarketTimeOut, log
 
 
 class Pancakeswap(Market):
+    # api отдает одну цену токена в usd: запрос в других базовых
+    # монетах вернул бы ту же цену
+    base_coins = (Market.usd_coin,)
+    tokens_url = 'https://api.pancakeswap.info/api/v2/tokens'
+    # индекс symbol -> address сохраняется между перезапусками
+    index_path = os.path.join(
+        os.path.dirname(__file__), 'coin_db', 'pancakeswap_tokens.json')
+    refresh_interval = 12 * 60 * 60  # sec
+    # список токенов большой, на его загрузку дается больше времени
+    timeout_for_tokens = 15  # sec
+    # через сколько повторять неудачную загрузку списка
+    retry_interval = 60  # sec
+    requests_per_second = 2
+    rate_burst = 2
+    # с адресом цена запрашивается без индекса токенов
+    probe_coin = Coin(
+        'wbnb', address='0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c')
 
     def __init__(self) -> None:
         super().__init__('Pancakeswap')
-        self.symbol_address_dict = {}
+        self.symbol_address_dict: Dict[str, str] = {}
+        self.index_loaded_at: float = None
+        # индекс есть (с диска или скачан), пусть и устаревший
+        self.index_ready = threading.Event()
+        self._index_lock = threading.Lock()
+        self._retry_at = 0.0
+        self._read_index()
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_name(self)}/{base_coin.get_name()}'
 
+    def _read_index(self) -> None:
+        try:
+            with open(self.index_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.symbol_address_dict = saved['tokens']
+        self.index_loaded_at = saved['loaded_at']
+        self.index_ready.set()
+
+    def _write_index(self) -> None:
+        tmp_path = f'{self.index_path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'loaded_at': self.index_loaded_at,
+                    'tokens': self.symbol_address_dict
+                }, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            log.error(f'Pancakeswap tokens are not saved: {e!r}')
+
+    def is_index_topical(self) -> bool:
+        return (self.index_loaded_at is not None and
+                time.time() - self.index_loaded_at < self.refresh_interval)
+
+    def refresh_index(self) -> None:
+        """скачивает список токенов и сохраняет индекс на диск"""
+        resp = self.http_get(self.tokens_url, timeout=self.timeout_for_tokens)
+        resp.raise_for_status()
+        tokens = {}
+        for address, data in fast_json.loads(resp.content)['data'].items():
+            tokens.setdefault(data['symbol'].upper(), address)
+        self.symbol_address_dict = tokens
+        self.index_loaded_at = time.time()
+        self.index_ready.set()
+        self._write_index()
+
+    def _refresh_in_background(self) -> None:
+        if not self._index_lock.acquire(blocking=False):
+            return
+        try:
+            if not self.is_index_topical():
+                self.refresh_index()
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.retry_interval
+            log.error(f'Pancakeswap tokens are not loaded: {e!r}')
+        finally:
+            self._index_lock.release()
+
+    def start_index_refresh(self) -> None:
+        """обновляет индекс в фоне, если обновление еще не идет"""
+        if self._index_lock.locked() or time.monotonic() < self._retry_at:
+            return
+        threading.Thread(
+            target=self._refresh_in_background,
+            name='pancakeswap-tokens', daemon=True).start()
+
     def find_address(self, coin: Coin) -> str:
-        resp = requests.get('https://api.pancakeswap.info/api/v2/tokens')
-        rjson = resp.json()['data']
-        for address, data in rjson.items():
-            if data['symbol'] == coin.get_upper_name(self):
-                return address
-        if coin.address:
-            return coin.address
+        """адрес токена: Coin.address, если он задан, иначе из индекса.
+        Индекс скачивается в фоне при первом обращении
+        и раз в refresh_interval, пока он обновляется, работает старый
+
+        Raises:
+            MarketTimeOut: индекс еще ни разу не загружен
+        """
+        if coin.get_address():
+            return coin.get_address()
+
+        symbol = coin.get_upper_name(self)
+        if not self.is_index_topical():
+            self.start_index_refresh()
+        if not self.index_ready.wait(self.get_request_timeout()):
+            raise MarketTimeOut(f'tokens for {self.name} are not loaded yet')
+        if symbol in self.symbol_address_dict:
+            return self.symbol_address_dict[symbol]
         raise CoinNotFound
 
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         target_base_amount = 510
 
-        if coin.get_upper_name(self) in self.symbol_address_dict:
-            address = self.symbol_address_dict[coin.get_upper_name(self)]
-        else:
-            address = self.find_address(coin)
+        address = self.find_address(coin)
 
-        resp = requests.get(
+        rjson = self.http_get_json(
             f'https://api.pancakeswap.info/api/v2/tokens/{address}')
-        price = float(resp.json()['data']['price'])
+        price = float(rjson['data']['price'])
         coin_amount = target_base_amount / price
 
-        asks = [CupEntry(float(price), float(coin_amount)), ]
-        bids = [CupEntry(float(price), float(coin_amount)), ]
-        return Cup(asks, bids)
+        asks = [CupEntry(price, coin_amount), ]
+        bids = [CupEntry(price, coin_amount), ]
+        return Cup.from_raw(asks, bids)
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         return 'https://pancakeswap.finance/swap'
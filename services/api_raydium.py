@@ -1,38 +1,138 @@
-import requests
-from .market_base import Market, Coin, Cup, CupEntry, CoinNotFound
+from typing import Dict, NamedTuple, Tuple
+import threading
+import time
+
+import ijson
+
+from .market_base import Market, Coin, Cup, CupEntry, CoinNotFound, \
+    MarketTimeOut, log
+
+
+class RaydiumPair(NamedTuple):
+    name: str
+    base_mint: str
+    price: float
+    # все монеты, который продаются
+    coin_amount: float
+    # все доллары которые продаются
+    base_amount: float
+
+
+class RaydiumPairIndex:
+    """Пары Raydium в памяти: по имени пары и по mint адресу монеты.
+    Список пар весит несколько мегабайт: он разбирается потоково (ijson,
+    с C-бэкендом yajl2_c, если он есть), не собираясь в память целиком,
+    и обновляется в фоне раз в refresh_interval секунд.
+    """
+    url = 'https://api.raydium.io/v2/main/pairs'
+    refresh_interval = 60  # sec
+    timeout_for_load = 30  # sec
+
+    def __init__(self, market: Market) -> None:
+        self.market = market
+        self.loaded = threading.Event()
+        self._by_name: Dict[str, RaydiumPair] = {}
+        self._by_mint: Dict[Tuple[str, str], RaydiumPair] = {}
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """запускает фоновое обновление, если оно еще не запущено"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._refresh_forever,
+                name='raydium-pairs', daemon=True)
+            self._thread.start()
+
+    def _refresh_forever(self) -> None:
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                log.error(f'Raydium pairs are not loaded: {e!r}')
+            time.sleep(self.refresh_interval)
+
+    def load(self) -> None:
+        resp = self.market.http_get(
+            self.url, stream=True, timeout=self.timeout_for_load)
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        items = ijson.items(resp.raw, 'item', use_float=True)
+
+        by_name = {}
+        by_mint = {}
+        try:
+            for data in items:
+                try:
+                    pair = RaydiumPair(
+                        name=data['name'],
+                        base_mint=data.get('baseMint'),
+                        price=float(data['price']),
+                        coin_amount=float(data['tokenAmountCoin']),
+                        base_amount=float(data['tokenAmountPc'])
+                    )
+                except (KeyError, TypeError, ValueError):
+                    # пул без цены или объема
+                    continue
+                by_name.setdefault(pair.name, pair)
+                if pair.base_mint and '-' in pair.name:
+                    quote = pair.name.split('-', 1)[1]
+                    by_mint.setdefault((pair.base_mint, quote), pair)
+        finally:
+            self.market.count_response_bytes(resp)
+
+        self._by_name = by_name
+        self._by_mint = by_mint
+        self.loaded.set()
+
+    def find(self, name: str) -> RaydiumPair:
+        return self._by_name.get(name)
+
+    def find_by_mint(self, mint: str, quote: str) -> RaydiumPair:
+        return self._by_mint.get((mint, quote))
 
 
 class Raydium(Market):
+    # пулы Raydium торгуются к USDC и USDT
+    base_coins = (Market.usdc_coin, Market.usdt_coin)
+    # цены берутся из загруженного списка пар, запросов к бирже нет
+    requests_per_second = 1000
+    rate_burst = 1000
 
     def __init__(self) -> None:
         super().__init__('Raydium')
-        self.symbol_address_dict = {}
+        self.pairs = RaydiumPairIndex(self)
+
+    def probe(self) -> None:
+        # цены берутся из памяти: жива ли биржа, видно только по api
+        self.http_get(self.pairs.url, stream=True).close()
 
-    def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
         return f'{coin.get_upper_name(self)}-{base_coin.get_upper_name()}'
 
-    def find_pair(self, coin: Coin, base_coin: Coin) -> str:
-        resp = requests.get('https://api.raydium.io/v2/main/pairs')
-        rjson = resp.json()
-        pair_name = self.make_name_for_market(coin, base_coin)
-        for data in rjson:
-            if data['name'] == pair_name:
-                return data
-        raise CoinNotFound
+    def find_pair(self, coin: Coin, base_coin: Coin) -> RaydiumPair:
+        self.pairs.start()
+        if not self.pairs.loaded.wait(self.get_request_timeout()):
+            raise MarketTimeOut(f'pairs for {self.name} are not loaded yet')
 
-    def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
-        pair_data = self.find_pair(coin, base_coin)
+        pair = None
+        if coin.get_address():
+            pair = self.pairs.find_by_mint(
+                coin.get_address(), base_coin.get_upper_name())
+        if pair is None:
+            pair = self.pairs.find(self.make_name_for_market(coin, base_coin))
+        if pair is None:
+            raise CoinNotFound
+        return pair
 
-        # цена
-        price = float(pair_data['price'])
-        # все монеты, который продаются
-        coin_amount = float(pair_data['tokenAmountCoin'])
-        # все доллары которые продаются
-        base_amount = float(pair_data['tokenAmountPc'])
+    def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
+        pair = self.find_pair(coin, base_coin)
 
-        asks = [CupEntry(price, coin_amount), ]
-        bids = [CupEntry(price, base_amount / price), ]
-        return Cup(asks, bids)
+        asks = [CupEntry(pair.price, pair.coin_amount), ]
+        bids = [CupEntry(pair.price, pair.base_amount / pair.price), ]
+        return Cup.from_raw(asks, bids)
 
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
         return 'https://raydium.io/swap'
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+import time
+
+
+class PairInfo(NamedTuple):
+    """пара из списка торгуемых пар биржи"""
+    symbol: str  # имя пары в api биржи
+    listed: bool = True  # торги по паре открыты
+    link: str = None  # ссылка на страницу торговли
+
+
+class PairCatalogue:
+    """Индекс торгуемых пар одной биржи:
+    (монета, базовая монета) -> PairInfo.
+    Имена монет хранятся в нижнем регистре.
+    """
+    refresh_interval = 24 * 60 * 60  # sec
+
+    def __init__(self) -> None:
+        self._pairs: Dict[Tuple[str, str], PairInfo] = {}
+        self.loaded_at: float = None
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def is_topical(self) -> bool:
+        """список загружен и не старше refresh_interval"""
+        return (self.is_loaded() and
+                time.time() - self.loaded_at < self.refresh_interval)
+
+    def update(
+            self,
+            pairs: Iterable[Tuple[str, str, PairInfo]]) -> None:
+        """заменяет индекс новым списком пар биржи"""
+        self._pairs = {
+            (coin_name.lower(), base_name.lower()): pair
+            for coin_name, base_name, pair in pairs
+        }
+        self.loaded_at = time.time()
+
+    def find(self, coin_name: str, base_name: str) -> Optional[PairInfo]:
+        return self._pairs.get((coin_name.lower(), base_name.lower()))
+
+    def set_link(self, coin_name: str, base_name: str, link: str) -> None:
+        key = (coin_name.lower(), base_name.lower())
+        if key in self._pairs:
+            self._pairs[key] = self._pairs[key]._replace(link=link)
+
+    def clear(self) -> None:
+        self._pairs = {}
+        self.loaded_at = None
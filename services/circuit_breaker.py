@@ -0,0 +1,96 @@
+from collections import deque
+from typing import Deque
+import time
+
+
+class CircuitBreaker:
+    """Автомат, отключающий биржу, которая не отвечает.
+
+    closed - запросы идут, результаты последних window запросов
+    запоминаются. Если из них не меньше min_calls и доля неудач
+    (таймаут, ошибка соединения, 5xx) достигла failure_ratio,
+    автомат переходит в open.
+    open - запросы не отправляются. Через open_for секунд автомат
+    переходит в half_open.
+    half_open - пропускается один пробный запрос: удача возвращает
+    closed, неудача - снова open на вдвое больший срок (до max_open_for).
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+            self, window: int = 20,
+            min_calls: int = 5,
+            failure_ratio: float = 0.5,
+            open_for: float = 30,
+            max_open_for: float = 10 * 60) -> None:
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.base_open_for = open_for
+        self.max_open_for = max_open_for
+
+        self.state = self.CLOSED
+        self.opens = 0  # сколько раз биржа отключалась
+        self.rejected = 0  # сколько запросов не отправлено
+        self.last_error: str = None
+        # True - запрос не удался
+        self._results: Deque[bool] = deque(maxlen=window)
+        self._open_for = open_for
+        self._opened_at: float = None
+        self._trial_sent = False
+
+    def allow(self) -> bool:
+        """можно ли отправить запрос сейчас"""
+        if self.state == self.OPEN and self.get_retry_in() == 0:
+            self.state = self.HALF_OPEN
+            self._trial_sent = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._trial_sent:
+            self._trial_sent = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._open_for = self.base_open_for
+            self._results.clear()
+        self._results.append(False)
+
+    def record_failure(self, error: str) -> None:
+        self.last_error = error
+        if self.state == self.HALF_OPEN:
+            self._open(min(self._open_for * 2, self.max_open_for))
+            return
+        self._results.append(True)
+        if (len(self._results) >= self.min_calls
+                and self.get_failure_ratio() >= self.failure_ratio):
+            self._open(self.base_open_for)
+
+    def record_ignored(self) -> None:
+        """запрос не дошел до биржи или прерван не по ее вине:
+        пробный запрос половинного состояния можно отправить заново
+        """
+        if self.state == self.HALF_OPEN:
+            self._trial_sent = False
+
+    def _open(self, open_for: float) -> None:
+        self.state = self.OPEN
+        self.opens += 1
+        self._open_for = open_for
+        self._opened_at = time.monotonic()
+
+    def get_failure_ratio(self) -> float:
+        if not self._results:
+            return 0.0
+        return sum(self._results) / len(self._results)
+
+    def get_retry_in(self) -> float:
+        """через сколько секунд open перейдет в half_open"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(
+            0.0, self._opened_at + self._open_for - time.monotonic())
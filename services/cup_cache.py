@@ -0,0 +1,71 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+import threading
+import time
+
+if TYPE_CHECKING:
+    from .market_base import Cup
+
+
+class CupCache:
+    """LRU кэш стаканов с ограниченным временем жизни.
+
+    Ключ - (маркет, пара, глубина). Стакан, запрошенный с большей
+    глубиной, отвечает и на запросы меньшей глубины.
+    Вытесняются пары, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, ttl: float = 10.0, max_size: int = 2000) -> None:
+        """
+        Args:
+            ttl (float): сколько секунд стакан считается свежим
+            max_size (int): сколько пар (маркет, пара) хранить
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # (маркет, пара) -> {глубина: (время получения, стакан)}
+        self._cups: OrderedDict[
+            Tuple[str, str], Dict[int, Tuple[float, Cup]]] = OrderedDict()
+
+    def get(self, market_name: str, pair: str, depth: int) -> Optional[Cup]:
+        """свежий стакан глубиной не меньше depth, обрезанный до depth"""
+        key = (market_name, pair)
+        now = time.monotonic()
+        with self._lock:
+            cups = self._cups.get(key)
+            if not cups:
+                return None
+            self._cups.move_to_end(key)
+
+            best_time, best_cup = 0.0, None
+            for cached_depth, (fetched_at, cup) in list(cups.items()):
+                if now - fetched_at > self.ttl:
+                    del cups[cached_depth]
+                    continue
+                if cached_depth >= depth and fetched_at > best_time:
+                    best_time, best_cup = fetched_at, cup
+            if not cups:
+                del self._cups[key]
+
+        if best_cup is None:
+            return None
+        return best_cup.cut(depth)
+
+    def put(self, market_name: str, pair: str, depth: int, cup: Cup) -> None:
+        key = (market_name, pair)
+        now = time.monotonic()
+        with self._lock:
+            cups = self._cups.setdefault(key, {})
+            cups[depth] = (now, cup)
+            # более мелкие стаканы теперь не нужны: новый отвечает и за них
+            for cached_depth in [d for d in cups if d < depth]:
+                del cups[cached_depth]
+            self._cups.move_to_end(key)
+            while len(self._cups) > self.max_size:
+                self._cups.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cups.clear()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+from itertools import chain
+from operator import itemgetter
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+import numpy as np
+
+
+_price_amount = itemgetter(0, 1)
+
+
+class CupEntry(NamedTuple):
+    """запись из биржевого стакана (depth of market)"""
+    price: float
+    amount: float
+
+
+class CupSide:
+    """Одна сторона стакана в массиве (n, 2) float64: цена, объем.
+
+    Ведет себя как список CupEntry: len, итерация, индекс, срез.
+    Срез не копирует данные, а ссылается на тот же массив.
+    """
+    __slots__ = ('levels',)
+
+    def __init__(self, levels: np.ndarray = None) -> None:
+        if levels is None:
+            levels = np.empty((0, 2), dtype=np.float64)
+        self.levels = levels
+
+    @classmethod
+    def from_raw(
+            cls, entries: Iterable,
+            depth: int = None) -> CupSide:
+        """сторона стакана из ответа биржи: записи [цена, объем, ...],
+        числа или строки, не больше depth записей
+        """
+        if isinstance(entries, np.ndarray):
+            levels = entries[:depth, :2].astype(np.float64)
+            return cls(np.ascontiguousarray(levels))
+        if not isinstance(entries, (list, tuple)):
+            entries = list(entries)
+        if depth is not None:
+            entries = entries[:depth]
+        if not len(entries):
+            return cls()
+        try:
+            # быстрый путь: записи ровно [цена, объем]
+            levels = np.fromiter(
+                map(float, chain.from_iterable(entries)), dtype=np.float64)
+        except (TypeError, ValueError):
+            levels = None
+        width = len(entries[0])
+        if (levels is not None and width > 2 and
+                len(levels) == width * len(entries) and
+                len(entries[-1]) == width):
+            # записи одной длины с лишними числами: [цена, объем, время]
+            levels = np.ascontiguousarray(
+                levels.reshape(-1, width)[:, :2])
+        elif levels is None or len(levels) != 2 * len(entries):
+            # лишние поля разной формы
+            levels = np.fromiter(
+                map(float, chain.from_iterable(map(_price_amount, entries))),
+                dtype=np.float64)
+        levels = levels.reshape(-1, 2)
+        return cls(levels)
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.levels[:, 0]
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self.levels[:, 1]
+
+    def best(self) -> Optional[CupEntry]:
+        """лучшая запись, None - сторона пустая"""
+        return self[0] if len(self) else None
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def __bool__(self) -> bool:
+        return len(self.levels) > 0
+
+    def __getitem__(
+            self, key: Union[int, slice]) -> Union[CupEntry, CupSide]:
+        if isinstance(key, slice):
+            return CupSide(self.levels[key])
+        price, amount = self.levels[key]
+        return CupEntry(float(price), float(amount))
+
+    def __iter__(self) -> Iterator[CupEntry]:
+        for price, amount in self.levels.tolist():
+            yield CupEntry(price, amount)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        if dtype is None:
+            return self.levels
+        return self.levels.astype(dtype, copy=False)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CupSide):
+            return np.array_equal(self.levels, other.levels)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'CupSide({list(self)!r})'
+
+
+class Cup(NamedTuple):
+    """запись из биржевого стакана (depth of market)
+    asks - предложения по продажи
+    bids - заявки на покупку
+    """
+    asks: CupSide
+    bids: CupSide
+
+    @classmethod
+    def from_raw(
+            cls, asks: Iterable,
+            bids: Iterable,
+            depth: int = None) -> Cup:
+        """стакан из ответа биржи: пары [цена, объем] с каждой стороны"""
+        return cls(
+            CupSide.from_raw(asks, depth),
+            CupSide.from_raw(bids, depth)
+        )
+
+    def cut(self, depth: int) -> Cup:
+        """стакан, обрезанный до depth записей с каждой стороны"""
+        return Cup(self.asks[:depth], self.bids[:depth])
@@ -0,0 +1,36 @@
+from __future__ import annotations
+from contextvars import ContextVar
+from typing import Optional
+import time
+
+
+class Deadline:
+    """Момент времени, к которому должен закончиться запрос
+    или вся цепочка запросов (например find_couple_for_best_deal)
+    """
+
+    def __init__(self, seconds: float) -> None:
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """сколько секунд осталось (не меньше нуля)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def shorten(self, seconds: float) -> Deadline:
+        """дедлайн для одного запроса внутри цепочки:
+        не позже общего и не дольше seconds от текущего момента
+        """
+        deadline = Deadline(seconds)
+        if deadline.expires_at > self.expires_at:
+            deadline.expires_at = self.expires_at
+        return deadline
+
+
+# дедлайн запроса, который сейчас выполняется.
+# Выставляется перед вызовом get_cup в пуле потоков,
+# адаптеры берут из него timeout для http запросов
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar(
+    'current_deadline', default=None)
@@ -0,0 +1,98 @@
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+
+class DepthWalk(NamedTuple):
+    """результат прохода по стаканам для нескольких объемов сделки
+    sizes - объемы сделки в базовой монете ($)
+    buy_vwap - средняя цена покупки монеты на каждый объем
+    sell_vwap - средняя цена продажи купленных монет
+    profit - доходность сделки (0.02 = 2%), nan - стаканы пустые
+    max_size - наибольший объем с доходностью не ниже minimal_profit
+    """
+    sizes: np.ndarray
+    buy_vwap: np.ndarray
+    sell_vwap: np.ndarray
+    profit: np.ndarray
+    max_size: float
+
+    def profit_at(self, size: float) -> float:
+        index = np.searchsorted(self.sizes, size)
+        if index >= len(self.sizes) or self.sizes[index] != size:
+            return float('nan')
+        return float(self.profit[index])
+
+
+def to_levels(entries) -> np.ndarray:
+    """записи стакана -> массив (n, 2): цена, объем"""
+    return np.asarray(entries, dtype=np.float64).reshape(-1, 2)
+
+
+def walk_depth(
+        asks, bids,
+        sizes: Sequence[float],
+        minimal_profit: float) -> DepthWalk:
+    """Считает, сколько можно заработать, купив монету по стакану asks
+    и продав ее по стакану bids, сразу для всех объемов из sizes.
+
+    Если в asks не хватает предложений на весь объем, покупается сколько
+    есть. Если в bids не хватает заявок, непроданные монеты ничего
+    не приносят.
+
+    Args:
+        asks: предложения на продажу (CupEntry или массив (n, 2))
+        bids: заявки на покупку (CupEntry или массив (n, 2))
+        sizes (Sequence[float]): объемы сделки в базовой монете
+        minimal_profit (float): доходность, с которой сделка интересна
+
+    Returns:
+        DepthWalk
+    """
+    asks = to_levels(asks)
+    bids = to_levels(bids)
+
+    ask_cost = np.cumsum(asks[:, 0] * asks[:, 1])
+    ask_amount = np.cumsum(asks[:, 1])
+    bid_amount = np.cumsum(bids[:, 1])
+    bid_proceeds = np.cumsum(bids[:, 0] * bids[:, 1])
+
+    # объем, на котором может смениться доходность - каждый уровень asks
+    sizes = np.unique(np.concatenate([
+        np.asarray(sizes, dtype=np.float64), ask_cost]))
+    sizes = sizes[sizes > 0]
+
+    if not len(asks) or not len(bids) or not len(sizes):
+        empty = np.full(len(sizes), np.nan)
+        return DepthWalk(sizes, empty, empty, empty, 0.0)
+
+    # покупка: на сколько денег реально хватит стакана
+    spent = np.minimum(sizes, ask_cost[-1])
+    level = np.minimum(np.searchsorted(ask_cost, spent), len(asks) - 1)
+    cost_before = np.where(level > 0, ask_cost[level - 1], 0.0)
+    amount_before = np.where(level > 0, ask_amount[level - 1], 0.0)
+    bought = amount_before + (spent - cost_before) / asks[level, 0]
+
+    # продажа купленного
+    sold = np.minimum(bought, bid_amount[-1])
+    level = np.minimum(np.searchsorted(bid_amount, sold), len(bids) - 1)
+    proceeds_before = np.where(level > 0, bid_proceeds[level - 1], 0.0)
+    amount_before = np.where(level > 0, bid_amount[level - 1], 0.0)
+    proceeds = proceeds_before + (sold - amount_before) * bids[level, 0]
+
+    profit = proceeds / spent - 1
+    profitable = sizes[profit >= minimal_profit]
+    # больше, чем есть в asks, купить все равно не получится
+    max_size = (
+        min(float(profitable[-1]), float(ask_cost[-1]))
+        if len(profitable) else 0.0
+    )
+
+    return DepthWalk(
+        sizes=sizes,
+        buy_vwap=spent / bought,
+        sell_vwap=np.divide(
+            proceeds, sold, out=np.zeros_like(proceeds), where=sold > 0),
+        profit=profit,
+        max_size=max_size
+    )
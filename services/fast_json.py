@@ -0,0 +1,47 @@
+"""Быстрый разбор json ответов бирж.
+
+Используется orjson, если он установлен, иначе msgspec, иначе json
+из стандартной библиотеки. Все они возвращают одинаковые dict/list,
+так что код адаптеров от выбора не зависит.
+"""
+from typing import Any, Union
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    decoder_name = 'orjson'
+elif msgspec is not None:
+    decoder_name = 'msgspec'
+    _decoder = msgspec.json.Decoder()
+else:
+    decoder_name = 'json'
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """разбирает json из bytes или str
+
+    Raises:
+        ValueError: некорректный json
+    """
+    # то, что быстрый декодер не разобрал (например целые больше
+    # 64 бит), разбирает json: он же сообщает об ошибке в ответе
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    elif msgspec is not None:
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError:
+            pass
+    return json.loads(data)
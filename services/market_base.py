@@ -1,20 +1,46 @@
 from __future__ import annotations
-from typing import List, NamedTuple, Tuple
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, \
+    Tuple
+import asyncio
+import contextvars
 import logging
-from datetime import datetime
-from signal import signal, SIGALRM, alarm
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
 from persistent import Persistent
 from persistent.dict import PersistentDict
 from ZODB import DB
+from ZODB.Connection import Connection
 import transaction
 
 from .coin_db.db_config import DB_NAME
+from .catalogue import PairCatalogue, PairInfo
+from .circuit_breaker import CircuitBreaker
+from .cup_cache import CupCache
+from .cup_side import Cup, CupEntry, CupSide
+from .deadline import Deadline, current_deadline
+from . import fast_json
+from .depth import walk_depth
+from . import metrics
+from .negative_cache import NegativeCache
+from .opportunity import OpportunityMatrix, rank_candidates
+from .rate_limit import TokenBucket
+from .streaming import BookStream
+from .transport import HttpTransport, get_wire_size
+from .write_behind import WriteBehind
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger('business_logic')
 
+# биржа ответила на текущий запрос: выставляется в http_get
+# (Market.mark_answered). Запрос, который закончился без ответа биржи
+# (например, промахом по индексу токенов в памяти), автомат не учитывает
+exchange_answered: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    'exchange_answered', default=False)
+
 
 class CoinNotFound(Exception):
     pass
@@ -24,16 +50,89 @@ class MarketTimeOut(Exception):
     pass
 
 
+class RateLimited(MarketTimeOut):
+    """запрос не отправлен или отклонен биржей из-за лимита запросов"""
+    pass
+
+
+class MarketUnavailable(MarketTimeOut):
+    """биржа отключена автоматом (circuit breaker), запрос не отправлен"""
+    pass
+
+
+class RequestNotSent(MarketTimeOut):
+    """запрос не отправлен: дедлайн кончился раньше, чем подошла
+    его очередь (в лимите запросов или в пуле потоков)
+    """
+    pass
+
+
 class Coin(Persistent):
-    con = DB(DB_NAME).open()
+    # соединение с базой открывается при первом обращении (get_connection)
+    _con: Connection = None
+    _writer: WriteBehind = None
     _all_coins: List[Coin] = []
+    # индексы реестра монет
+    _coins_by_name: Dict[str, Coin] = {}
+    # (имя маркета, имя монеты на этом маркете) -> монета
+    _coins_by_alias: Dict[Tuple[str, str], Coin] = {}
+    _coins_by_address: Dict[str, Coin] = {}
+    # имя монеты -> ключ в con.root.coins
+    _db_keys: Dict[str, int] = {}
+
+    @classmethod
+    def get_connection(cls) -> Connection:
+        if cls._con is None:
+            manager = transaction.TransactionManager()
+            cls._con = DB(DB_NAME).open(transaction_manager=manager)
+            cls._writer = WriteBehind(manager)
+        return cls._con
+
+    @classmethod
+    def get_writer(cls) -> WriteBehind:
+        """изменения монет сохраняются через него пачками"""
+        cls.get_connection()
+        return cls._writer
+
+    @classmethod
+    def flush_changes(cls) -> None:
+        """сохраняет отложенные изменения (при выключении бота)"""
+        if cls._writer is not None:
+            cls._writer.flush()
 
     @classmethod
     def get_coin_by_name(cls, name: str) -> Coin:
-        for coin in cls._all_coins:
-            if coin.get_name() == name.lower():
-                return coin
-        return None
+        return cls._coins_by_name.get(name.lower())
+
+    @classmethod
+    def get_coin_by_alias(cls, market_name: str, alias: str) -> Coin:
+        """монета по ее имени на конкретном маркете"""
+        return cls._coins_by_alias.get((market_name, alias.lower()))
+
+    @classmethod
+    def get_coin_by_address(cls, address: str) -> Coin:
+        return cls._coins_by_address.get(address.lower())
+
+    @classmethod
+    def _index_coin(cls, coin: Coin, key: int) -> None:
+        cls._coins_by_name[coin.name] = coin
+        cls._db_keys[coin.name] = key
+        for market_name, alias in coin.alter_names.items():
+            cls._coins_by_alias[(market_name, alias.lower())] = coin
+        if coin.address:
+            cls._coins_by_address[coin.address.lower()] = coin
+
+    @classmethod
+    def _unindex_coin(cls, coin: Coin) -> None:
+        cls._coins_by_name.pop(coin.name, None)
+        cls._db_keys.pop(coin.name, None)
+        for market_name, alias in coin.alter_names.items():
+            cls._coins_by_alias.pop((market_name, alias.lower()), None)
+        if coin.address:
+            cls._coins_by_address.pop(coin.address.lower(), None)
+
+    def _is_registered(self) -> bool:
+        return self.__class__._coins_by_name.get(self.name) is self
 
     @classmethod
     def new_coin(cls, name: str) -> Coin:
@@ -50,28 +149,43 @@ class Coin(Persistent):
             return coin
         coin = Coin(name)
 
-        if len(cls.con.root.coins) != 0:
-            new_key = cls.con.root.coins.maxKey() + 1
-        else:
-            new_key = 1
-        cls.con.root.coins[new_key] = coin
-        transaction.commit()
+        coins = cls.get_connection().root.coins
+        writer = cls.get_writer()
+        with writer.lock:
+            if len(coins) != 0:
+                new_key = coins.maxKey() + 1
+            else:
+                new_key = 1
+            coins[new_key] = coin
+        writer.mark_dirty()
 
         cls._all_coins.append(coin)
+        cls._index_coin(coin, new_key)
         return coin
 
     @classmethod
     def update_coins_from_db(cls):
-        cls._all_coins = [coin for coin in cls.con.root.coins.values()]
+        cls._all_coins = []
+        cls._coins_by_name = {}
+        cls._coins_by_alias = {}
+        cls._coins_by_address = {}
+        cls._db_keys = {}
+        for key, coin in cls.get_connection().root.coins.items():
+            cls._all_coins.append(coin)
+            cls._index_coin(coin, key)
 
     @classmethod
     def delete_coin(cls, name: str) -> None:
-        for key, coin in cls.con.root.coins.items():
-            if coin.get_name() == name.lower():
-                cls.con.root.coins.pop(key)
-                transaction.commit()
-                break
-        cls.update_coins_from_db()
+        coin = cls.get_coin_by_name(name)
+        if not coin:
+            return
+        writer = cls.get_writer()
+        with writer.lock:
+            cls.get_connection().root.coins.pop(cls._db_keys[coin.name])
+        writer.mark_dirty()
+
+        cls._unindex_coin(coin)
+        cls._all_coins.remove(coin)
 
     @classmethod
     def get_all_coins(cls) -> List[Coin]:
@@ -106,28 +220,44 @@ class Coin(Persistent):
 
     def put_new_name(self, name: str, market: Market) -> None:
         """new alter specific name for market"""
-        self.alter_names[market.name] = name.lower()
-        transaction.commit()
+        registered = self._is_registered()
+        if registered and market.name in self.alter_names:
+            self._coins_by_alias.pop(
+                (market.name, self.alter_names[market.name].lower()), None)
+        writer = self.get_writer()
+        with writer.lock:
+            self.alter_names[market.name] = name.lower()
+        writer.mark_dirty()
+        if registered:
+            self._coins_by_alias[(market.name, name.lower())] = self
 
     def put_new_address(self, address: str) -> None:
         """new alter specific name for market"""
-        self.address = address
-        transaction.commit()
-
-
-class CupEntry(NamedTuple):
-    """запись из биржевого стакана (depth of market)"""
-    price: float
-    amount: float
-
-
-class Cup(NamedTuple):
-    """запись из биржевого стакана (depth of market)
-    asks - предложения по продажи
-    bids - заявки на покупку
+        registered = self._is_registered()
+        if registered and self.address:
+            self._coins_by_address.pop(self.address.lower(), None)
+        writer = self.get_writer()
+        with writer.lock:
+            self.address = address
+        writer.mark_dirty()
+        if registered:
+            self._coins_by_address[address.lower()] = self
+
+
+class Ticker(NamedTuple):
+    """лучшие цены пары из снимка всех тикеров биржи
+    None - заявок на этой стороне нет
     """
-    asks: List[CupEntry]
-    bids: List[CupEntry]
+    ask: Optional[float]
+    bid: Optional[float]
+
+    @classmethod
+    def from_raw(cls, ask, bid) -> Ticker:
+        """тикер из ответа биржи: пустые и нулевые цены -> None"""
+        return cls(
+            ask=float(ask) if ask and float(ask) else None,
+            bid=float(bid) if bid and float(bid) else None
+        )
 
 
 class Price(NamedTuple):
@@ -146,15 +276,88 @@ class BestPrice(NamedTuple):
     """
     best_ask: Price
     best_bid: Price
+    # сколько $ можно провести по стаканам с доходностью minimal_profit
+    max_size: float = 0.0
+    # ответ собран не полностью: время (budget) кончилось раньше
+    partial: bool = False
+    # маркеты, которые не ответили вовремя
+    late_markets: Tuple[str, ...] = ()
+
+
+class PriceScan(NamedTuple):
+    """цены монеты со всех маркетов"""
+    prices: List[BestPrice]
+    # маркеты, которые не ответили вовремя
+    late_markets: Tuple[str, ...] = ()
 
 
 class Market:
     all_markets: List[Market] = []
-    timeout_for_get = 3  # sec
+    # последние найденные лучшие цены по имени монеты
+    last_prices: Dict[str, BestPrice] = {}
+    # timeout одного запроса к бирже
+    timeout_for_get = 0.9  # sec
+    # общий дедлайн на поиск сделки по одной монете
+    timeout_for_deal = 5.0  # sec
+    # сколько ждет ответа человек, нажавший кнопку (budget)
+    timeout_for_reply = 1.0  # sec
+    # объем сделки, на котором проверяется глубина стаканов
+    target_size = 500  # $
+    minimal_profit = 0.02  # %
+    # сколько лучших по спреду пар проверять по стаканам
+    deal_candidates = 5
+    # ошибки стакана одной из бирж пары (пару сняли с торгов, 5xx,
+    # ответ не разобрался): пара отклоняется, проверяются следующие
+    depth_errors = (
+        CoinNotFound, requests.exceptions.RequestException,
+        KeyError, IndexError, TypeError, ValueError)
+    # объемы, для которых считается доходность по стаканам
+    trade_sizes = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)  # $
+    # сколько запросов к биржам может идти одновременно
+    max_parallel_requests = 20
+    _executor = ThreadPoolExecutor(max_workers=max_parallel_requests)
+    # места в пуле на все маркеты и все одновременные поиски
+    _request_slots: asyncio.Semaphore = None
+    _request_slots_loop: asyncio.AbstractEventLoop = None
+    # сколько секунд полученный стакан можно использовать повторно
+    cup_cache_ttl = 10  # sec
+    cup_cache = CupCache(ttl=cup_cache_ttl, max_size=2000)
+    # есть ли у биржи запрос лучших цен по всем парам сразу (get_tickers)
+    has_tickers = False
+    # сколько секунд живет снимок тикеров (примерно один цикл сканирования)
+    tickers_ttl = 30  # sec
+    # умеет ли биржа отдавать список всех своих пар (load_pairs)
+    has_catalogue = False
+    # список пар большой, на его загрузку дается больше времени
+    timeout_for_catalogue = 15.0  # sec
+    # через сколько повторять неудачную загрузку списка пар
+    catalogue_retry_interval = 60  # sec
+    # общий пул keep-alive соединений для всех маркетов
+    http = HttpTransport(pool_maxsize=max_parallel_requests)
+    # лимит запросов к бирже: requests_per_second в среднем,
+    # не больше rate_burst подряд. Вес обычного запроса - request_weight,
+    # запроса всех тикеров или всех пар - list_request_weight
+    requests_per_second = 10
+    rate_burst = 10
+    request_weight = 1
+    list_request_weight = 1
+    # сколько ждать, если биржа ответила 429 без Retry-After
+    throttle_pause = 10  # sec
+    # монета, стаканом которой проверяется, что отключенная биржа ожила
+    probe_coin = Coin('btc')
+    # websocket со стаканами (services/streaming.py), None - только REST
+    stream_url: str = None
+    # сколько записей стакана присылает поток. Стаканы глубже
+    # берутся только через REST, и пара ради них не подписывается
+    stream_depth = 20
+    # стакан из потока старше этого не используется
+    stream_max_age = 30  # sec
 
     usd_coin = Coin('usd')
     usdt_coin = Coin('usdt')
     usdc_coin = Coin('usdc')
+    # базовые монеты, в которых ищутся цены. Биржа, которая заведомо
+    # торгует не во всех, переопределяет их у себя (см. plan_quotes)
     base_coins = (usd_coin, usdt_coin, usdc_coin)
 
     @classmethod
@@ -170,217 +373,1077 @@ class Market:
         return None
 
     @classmethod
-    def get_best_price(cls, coin: Coin) -> BestPrice:
-        """Ищет лучшую цену среди всех маркетов
+    async def get_all_prices(
+            cls, coin: Coin, deadline: Deadline = None) -> List[BestPrice]:
+        """Цены монеты на всех маркетах во всех базовых монетах.
+        Запросы уходят одновременно, не ответившие вовремя
+        и не знающие монету маркеты пропускаются.
+
+        Args:
+            coin (Coin): монета, цена которой интересует
+            deadline (Deadline, optional): общий дедлайн на все запросы
+
+        Returns:
+            List[BestPrice]: цены маркетов, возможно пустой
+        """
+        return (await cls.scan_prices(coin, deadline)).prices
+
+    @classmethod
+    async def scan_prices(
+            cls, coin: Coin,
+            deadline: Deadline = None,
+            budget: float = None) -> PriceScan:
+        """get_all_prices, который ждет ответов не дольше budget.
+        Запросы, не успевшие за budget, не прерываются: их ответы
+        попадут в кэши (cup_cache, тикеры) к следующему запросу
+
+        Args:
+            coin (Coin): монета, цена которой интересует
+            deadline (Deadline, optional): общий дедлайн на все запросы
+            budget (float, optional): сколько ждать ответов, sec.
+                По умолчанию - пока не ответят все
+
+        Returns:
+            PriceScan: цены и маркеты, которые не ответили вовремя
+        """
+        log.info('started serching prices')
+        # число одновременных запросов ограничивает run_with_deadline
+        tasks = {
+            asyncio.create_task(
+                market.get_price(coin, base_coin, deadline)): market
+            for market in cls.all_markets
+            for base_coin in market.plan_quotes(coin)
+        }
+        if not tasks:
+            return PriceScan(prices=[])
+        done, pending = await asyncio.wait(tasks, timeout=budget)
+
+        prices = []
+        late = set()
+        for task, market in tasks.items():
+            if task in pending:
+                late.add(market.name)
+                task.add_done_callback(cls._forget_result)
+                continue
+            try:
+                prices.append(task.result())
+            except (CoinNotFound, MarketUnavailable):
+                continue
+            except MarketTimeOut:
+                late.add(market.name)
+        return PriceScan(
+            prices=prices,
+            late_markets=tuple(
+                market.name for market in cls.all_markets
+                if market.name in late)
+        )
+
+    @staticmethod
+    def _forget_result(task: asyncio.Task) -> None:
+        """ответ опоздавшего запроса никто не ждет"""
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    def pick_best_price(
+            cls, coin: Coin, prices: List[BestPrice]) -> BestPrice:
+        """лучшие ask и bid из цен маркетов, запоминается в last_prices
+
+        Raises:
+            CoinNotFound: цен нет
+        """
+        if not prices:
+            cls.last_prices.pop(coin.get_name(), None)
+            raise CoinNotFound
+
+        best_prices = BestPrice(
+            best_ask=min(
+                (price.best_ask for price in prices),
+                key=lambda price: price.number),
+            best_bid=max(
+                (price.best_bid for price in prices),
+                key=lambda price: price.number)
+        )
+        cls.last_prices[coin.get_name()] = best_prices
+        return best_prices
+
+    @classmethod
+    async def get_best_price(
+            cls, coin: Coin,
+            deadline: Deadline = None,
+            budget: float = None) -> BestPrice:
+        """Ищет лучшую цену среди всех маркетов.
 
         Args:
             coin (Coin): монета, цена которой интересует
+            deadline (Deadline, optional): общий дедлайн на все запросы
+            budget (float, optional): сколько ждать ответа, sec.
+                Когда время кончается, отдается лучшая цена
+                из уже полученных (partial)
 
         Raises:
             CoinNotFound: монета ни где не найдена
+            MarketTimeOut: за budget не ответил ни один маркет,
+                который мог бы знать монету
 
         Returns:
             BestPrice: цена на покупку и продажу
         """
-        log.info('started serching prices')
-        best_ask: Price = None
-        best_bid: Price = None
-        for market in cls.all_markets:
-            for base_coin in cls.base_coins:
-                try:
-                    price = market.get_price(coin, base_coin)
-                except CoinNotFound:
-                    continue
-                except MarketTimeOut:
-                    continue
-                # print(
-                #     f'best_ask:{price.best_ask.number}{price.best_ask.base_coin.get_upper_name()}{price.best_ask.market.name}'
-                #     f'\nbest_bid:{price.best_bid.number}{price.best_bid.base_coin.get_upper_name()}{price.best_bid.market.name}')
-
-                if not best_bid:
-                    best_ask = price.best_ask
-                    best_bid = price.best_bid
-                    continue
-
-                if price.best_ask.number < best_ask.number:
-                    best_ask = price.best_ask
-                if price.best_bid.number > best_bid.number:
-                    best_bid = price.best_bid
-
-        if not best_bid:
-            raise CoinNotFound
+        scan = await cls.scan_prices(coin, deadline, budget)
+        cls.check_scan(scan, budget)
+        return cls.pick_best_price(coin, scan.prices)._replace(
+            partial=bool(scan.late_markets),
+            late_markets=scan.late_markets
+        )
 
-        return BestPrice(best_ask=best_ask, best_bid=best_bid)
+    @staticmethod
+    def check_scan(scan: PriceScan, budget: Optional[float]) -> None:
+        """Raises:
+            MarketTimeOut: цен нет, но ответили не все маркеты
+                (только если задан budget)
+        """
+        if budget is not None and not scan.prices and scan.late_markets:
+            raise MarketTimeOut(
+                f'no answer from {", ".join(scan.late_markets)}')
 
     @classmethod
-    async def find_couple_for_best_deal(cls, coin: Coin) -> BestPrice:
-        """ находит лучшую цену с достаточным объемом
+    def get_candidates(
+            cls, prices: List[BestPrice],
+            matrix: OpportunityMatrix) -> List[BestPrice]:
+        """пары для сделки из матрицы, лучшие первыми"""
+        return [
+            BestPrice(
+                best_ask=prices[candidate.ask_index].best_ask,
+                best_bid=prices[candidate.bid_index].best_bid)
+            for candidate in matrix.get_candidates(
+                cls.minimal_profit, cls.deal_candidates)
+        ]
+
+    @staticmethod
+    def make_matrix(prices: List[BestPrice]) -> OpportunityMatrix:
+        return OpportunityMatrix(
+            asks=[price.best_ask.number for price in prices],
+            bids=[price.best_bid.number for price in prices]
+        )
+
+    @classmethod
+    async def check_depth(
+            cls, coin: Coin,
+            prices: BestPrice,
+            deadline: Deadline) -> BestPrice:
+        """Проверяет по стаканам, что на пару можно провести target_size.
+
+        Raises:
+            MarketTimeOut: стаканы не получены вовремя
+            depth_errors: стакан одной из бирж не получен или не разобран
+
+        Returns:
+            BestPrice: пара с max_size
+            None: объема не хватает
+        """
+        asks, bids = await asyncio.gather(
+            prices.best_ask.market.get_asks(
+                coin=coin,
+                base_coin=prices.best_ask.base_coin,
+                depth=100,
+                deadline=deadline
+            ),
+            prices.best_bid.market.get_bids(
+                coin=coin,
+                base_coin=prices.best_bid.base_coin,
+                depth=100,
+                deadline=deadline
+            )
+        )
+        walk = walk_depth(
+            asks, bids,
+            sizes=cls.trade_sizes + (cls.target_size,),
+            minimal_profit=cls.minimal_profit
+        )
+        # nan (пустой стакан) тоже не проходит
+        if not walk.profit_at(cls.target_size) >= cls.minimal_profit:
+            return
+
+        return prices._replace(max_size=walk.max_size)
+
+    @classmethod
+    async def find_couple_for_best_deal(
+            cls, coin: Coin,
+            deadline: Deadline = None,
+            budget: float = None) -> BestPrice:
+        """ находит лучшую цену с достаточным объемом.
+        Если у лучшей пары не хватает объема, проверяются следующие
+        по спреду пары (не больше deal_candidates)
+
+        Args:
+            coin (Coin): монета, для которой ищется сделка
+            deadline (Deadline, optional): дедлайн на всю цепочку запросов.
+                По умолчанию timeout_for_deal
+            budget (float, optional): сколько ждать ответа, sec.
+                Цены ждутся половину budget, стаканы - остаток.
+                Когда время кончается, отдается лучшая пара из уже
+                полученных цен (partial); если ее объем не успели
+                проверить, max_size у нее 0
+
         Raises:
             CoinNotFound: монета не существует ни где
+            MarketTimeOut: за budget не ответил ни один маркет,
+                который мог бы знать монету
 
         Returns:
             BestPrice: цена на покупку и продажу
             None: нет хорошего предложения
         """
-        target_size = 500  # $
-        minimal_profit = 0.02  # %
-
-        prices = cls.get_best_price(coin)
+        if deadline is None:
+            deadline = Deadline(cls.timeout_for_deal)
+        # цены запрашиваются с обычным дедлайном, чтобы опоздавшие
+        # ответы все же попали в кэши, а ждем их не дольше budget
+        reply_deadline = deadline
+        scan_budget = None
+        if budget is not None:
+            reply_deadline = deadline.shorten(budget)
+            # вторая половина остается на проверку стаканов
+            scan_budget = budget / 2
+
+        scan = await cls.scan_prices(coin, deadline, scan_budget)
+        cls.check_scan(scan, budget)
+        prices = scan.prices
+        cls.pick_best_price(coin, prices)
         log.info('started price control')
-        if not prices:
-            return
-        if ((prices.best_bid.number / prices.best_ask.number)
-                < (1 + minimal_profit)):
-            return
 
-        asks = prices.best_ask.market.get_asks(
-            coin=coin,
-            base_coin=prices.best_ask.base_coin,
-            depth=100
-        )
-        ask_size = 0
-        ask_count = 0
-        for entry in asks:
-            target_count_coins = (target_size - ask_size)/entry.price
-            if entry.amount < target_count_coins:
-                ask_size += entry.price * entry.amount
-                ask_count += entry.amount
-            else:
-                ask_size += entry.price * target_count_coins
-                ask_count += target_count_coins
+        candidates = cls.get_candidates(prices, cls.make_matrix(prices))
+        # лучшая пара, объем которой не успели проверить
+        unchecked: BestPrice = None
+        for candidate in candidates:
+            if reply_deadline.expired():
+                unchecked = unchecked or candidate
                 break
+            try:
+                deal = await cls.check_depth(coin, candidate, reply_deadline)
+            except MarketTimeOut:
+                log.info(
+                    f'{coin.get_upper_name()} - depth control is timed out')
+                unchecked = unchecked or candidate
+                continue
+            except cls.depth_errors as e:
+                log.info(
+                    f'{coin.get_upper_name()} - candidate is rejected: {e!r}')
+                continue
+            if deal:
+                return deal._replace(
+                    partial=bool(scan.late_markets),
+                    late_markets=scan.late_markets)
+
+        if budget is not None and unchecked is not None:
+            return unchecked._replace(
+                partial=True, late_markets=scan.late_markets)
+
+    @classmethod
+    async def find_deals(
+            cls, coins: List[Coin],
+            deadline: Deadline = None) -> List[BestPrice]:
+        """Ищет сделки сразу по списку монет.
+        Спреды всех монет сортируются вместе, и глубина проверяется
+        для deal_candidates лучших пар на монету в общем порядке
 
-        bids = prices.best_bid.market.get_bids(
-            coin=coin,
-            base_coin=prices.best_bid.base_coin,
-            depth=100
+        Args:
+            coins (List[Coin]): монеты для проверки
+            deadline (Deadline, optional): дедлайн на весь список.
+                По умолчанию timeout_for_deal
+
+        Returns:
+            List[BestPrice]: найденные сделки, не больше одной на монету
+        """
+        if deadline is None:
+            deadline = Deadline(cls.timeout_for_deal)
+
+        all_prices = await asyncio.gather(*[
+            cls.get_all_prices(coin, deadline) for coin in coins])
+        for coin, prices in zip(coins, all_prices):
+            try:
+                cls.pick_best_price(coin, prices)
+            except CoinNotFound:
+                pass
+
+        ranked = rank_candidates(
+            [cls.make_matrix(prices) for prices in all_prices],
+            minimal_profit=cls.minimal_profit,
+            top_k=cls.deal_candidates * len(coins)
         )
-        bid_size = 0
-        bid_count = ask_count
-        for entry in bids:
-            if entry.amount < bid_count:
-                bid_size += entry.price * entry.amount
-                bid_count -= entry.amount
-            else:
-                bid_size += entry.price * bid_count
-                bid_count = 0
+
+        deals: Dict[int, BestPrice] = {}
+        for index, candidate in ranked:
+            if deadline.expired():
                 break
+            if index in deals:
+                continue
+            prices = all_prices[index]
+            try:
+                deal = await cls.check_depth(
+                    coins[index],
+                    BestPrice(
+                        best_ask=prices[candidate.ask_index].best_ask,
+                        best_bid=prices[candidate.bid_index].best_bid),
+                    deadline
+                )
+            except MarketTimeOut:
+                log.info(
+                    f'{coins[index].get_upper_name()} - '
+                    f'depth control is timed out')
+                continue
+            except cls.depth_errors as e:
+                log.info(
+                    f'{coins[index].get_upper_name()} - '
+                    f'candidate is rejected: {e!r}')
+                continue
+            if deal:
+                deals[index] = deal
+        return [deals[index] for index in sorted(deals)]
 
-        if (bid_size / ask_size) < (1 + minimal_profit):
-            return
+    @classmethod
+    async def refresh_catalogues(cls) -> None:
+        """загружает списки пар всех бирж, которые это умеют"""
+        await asyncio.gather(*[
+            market.refresh_catalogue()
+            for market in cls.all_markets if market.has_catalogue
+        ])
 
-        return prices
+    @classmethod
+    def get_request_slots(cls) -> asyncio.Semaphore:
+        """Общий для всех маркетов лимит одновременных запросов
+        по числу потоков пула: место занято, пока запрос занимает поток,
+        и запрос, взявший место, сразу получает поток.
+        Без него параллельные поиски (сканер, кнопки) ставили запросы
+        в очередь пула, и ожидание в ней съедало их timeout
+        """
+        loop = asyncio.get_running_loop()
+        if cls._request_slots_loop is not loop:
+            cls._request_slots = asyncio.Semaphore(cls.max_parallel_requests)
+            cls._request_slots_loop = loop
+        return cls._request_slots
 
     @classmethod
     def clear_cache(cls) -> None:
         """Очишает данные хранящиеся в оперативке"""
+        cls.cup_cache.clear()
         for market in cls.all_markets:
-            market.info_non_existent_coins.clear()
+            market.not_found.clear()
+
+    @classmethod
+    async def stop_streams(cls) -> None:
+        await asyncio.gather(*[
+            market.stream.stop()
+            for market in cls.all_markets if market.stream is not None
+        ])
+
+    @classmethod
+    def update_metrics(cls) -> None:
+        """состояние маркетов в метрики, перед каждой их выдачей"""
+        for market in cls.all_markets:
+            metrics.market_available.set(
+                market.name,
+                value=float(market.breaker.state == CircuitBreaker.CLOSED))
+            metrics.rate_limit_wait_seconds.set(
+                market.name, value=market.rate_limiter.stats.total_wait)
+            if market.stream is not None:
+                metrics.stream_connected.set(
+                    market.name, value=float(market.stream.connected))
+                metrics.stream_messages.set(
+                    market.name, value=market.stream.messages)
 
     def __init__(self, name: str) -> None:
         self.name = name
         self.__class__.all_markets.append(self)
 
-        self.date_info = datetime.today().date()
-        self.info_non_existent_coins = []
+        # пары, которые недавно не удалось получить
+        self.not_found = NegativeCache()
 
-    def handler_timeout(self, signum, frame):
-        raise MarketTimeOut(f'time for {self.name} is out')
+        self._tickers: Dict[str, Ticker] = None
+        self._tickers_time: float = None
+        self._tickers_task: asyncio.Future = None
 
-    def is_info_topical(self) -> bool:
-        if self.date_info == datetime.today().date():
-            return True
-        else:
-            self.date_info = datetime.today().date()
-            self.info_non_existent_coins = []
-            return False
+        self.catalogue = PairCatalogue()
+        self._catalogue_task: asyncio.Future = None
+        # раньше этого времени (monotonic) неудачная загрузка не повторяется
+        self._catalogue_retry_at = 0.0
+
+        self.stream = BookStream(self) if self.stream_url else None
+        # общий лимит для всех запросов к бирже
+        self.rate_limiter = TokenBucket(
+            rate=self.requests_per_second, burst=self.rate_burst)
+        # отключает биржу, если она перестала отвечать
+        self.breaker = CircuitBreaker()
+        self._probe_task: asyncio.Future = None
+
+    def make_pair_key(self, coin: Coin, base_coin: Coin) -> str:
+        """ключ пары для кэшей маркета"""
+        return f'{coin.get_name(self)}/{base_coin.get_name(self)}'
 
     def coin_not_exist(self, coin: Coin, base_coin: Coin) -> bool:
-        """если пара в списке несуществующих на этой бирже
-        и информация акутальная (сегодняшняя)
+        """если пары нет в списке пар биржи
+        или ее недавно не удалось получить (см. not_found)
         """
-        pair_name = f'{coin.get_name(self)}{base_coin.get_name(self)}'
-        if pair_name in self.info_non_existent_coins:
-            if self.is_info_topical():
+        if self.catalogue.is_loaded():
+            pair = self.get_pair_info(coin, base_coin)
+            if pair is None or not pair.listed:
                 return True
-        return False
+        return self.make_pair_key(coin, base_coin) in self.not_found
+
+    def plan_quotes(self, coin: Coin) -> List[Coin]:
+        """базовые монеты, в которых стоит спрашивать цену монеты:
+        пары из списка пар биржи, а без него - все base_coins биржи,
+        кроме пар, которых по прошлым запросам нет (not_found).
+        Пары, которые недавно не ответили, остаются:
+        get_price сразу сообщит о таймауте
+        """
+        quotes = []
+        for base_coin in self.base_coins:
+            if (self.coin_not_exist(coin, base_coin) and
+                    self.not_found.reason(self.make_pair_key(
+                        coin, base_coin)) != NegativeCache.TIMEOUT):
+                continue
+            quotes.append(base_coin)
+        return quotes
+
+    def get_pair_info(self, coin: Coin, base_coin: Coin) -> PairInfo:
+        """пара из списка пар биржи, None - если ее нет
+        или список не загружен
+        """
+        return self.catalogue.find(
+            coin.get_name(self), base_coin.get_name(self))
+
+    async def refresh_catalogue(self) -> None:
+        """загружает список пар биржи.
+        Одновременные вызовы ждут одну и ту же загрузку
+        """
+        await asyncio.shield(self.start_catalogue_load())
+
+    def start_catalogue_load(self) -> asyncio.Future:
+        """запускает загрузку списка пар, если она еще не идет"""
+        if self._catalogue_task is None or self._catalogue_task.done():
+            self._catalogue_task = asyncio.ensure_future(
+                self._load_catalogue())
+        return self._catalogue_task
+
+    def is_catalogue_due(self) -> bool:
+        """список пар пора обновить: он устарел, загрузка не идет,
+        а после неудачной загрузки прошло catalogue_retry_interval
+        """
+        return (
+            self.has_catalogue and not self.catalogue.is_topical()
+            and (self._catalogue_task is None or self._catalogue_task.done())
+            and time.monotonic() >= self._catalogue_retry_at)
+
+    async def _load_catalogue(self) -> None:
+        try:
+            pairs = await self.run_with_deadline(
+                None, self.load_pairs,
+                timeout=self.timeout_for_catalogue,
+                weight=self.list_request_weight)
+        except Exception as e:
+            self._catalogue_retry_at = (
+                time.monotonic() + self.catalogue_retry_interval)
+            log.error(f'pairs from {self.name} are not loaded: {e!r}')
+            return
+        self.catalogue.update(pairs)
+        log.info(f'{self.name}: loaded {len(self.catalogue)} pairs')
+
+    def get_request_timeout(self) -> float:
+        """timeout для http запроса внутри get_cup:
+        сколько осталось до дедлайна текущего запроса
+
+        Raises:
+            RequestNotSent: дедлайн прошел, а биржа еще ни разу не ответила
+            MarketTimeOut: дедлайн прошел
+        """
+        deadline = current_deadline.get()
+        if deadline is None:
+            return self.timeout_for_get
+        if deadline.expired():
+            if not exchange_answered.get():
+                raise RequestNotSent(f'time for {self.name} is out')
+            raise MarketTimeOut(f'time for {self.name} is out')
+        return deadline.remaining()
+
+    @staticmethod
+    def mark_answered() -> None:
+        """отмечает, что биржа ответила на текущий запрос.
+        Адаптеры, которые ходят мимо http_get, вызывают ее сами
+        """
+        exchange_answered.set(True)
+
+    def http_get(
+            self, url: str,
+            params: dict = None,
+            timeout: float = None,
+            **kwargs) -> requests.Response:
+        """GET через общий пул соединений с timeout текущего запроса
+        (или с заданным timeout). На 429 лимит биржи ставится на паузу.
+        Тело ответа с stream=True после чтения учитывается
+        в метриках через count_response_bytes
+
+        Raises:
+            RateLimited: биржа ответила 429
+            requests.exceptions.HTTPError: биржа ответила 5xx
+        """
+        if timeout is None:
+            timeout = self.get_request_timeout()
+        resp = self.http.get(url, params=params, timeout=timeout, **kwargs)
+        self.mark_answered()
+        metrics.http_requests_total.inc(self.name)
+        if not kwargs.get('stream'):
+            self.count_response_bytes(resp)
+        if resp.status_code == 429:
+            try:
+                pause = float(resp.headers['Retry-After'])
+            except (KeyError, ValueError):
+                pause = self.throttle_pause
+            log.warning(f'{self.name} rate limit is hit, pause {pause} sec')
+            self.rate_limiter.pause(pause)
+            raise RateLimited(f'{self.name} answered 429')
+        if resp.status_code >= 500:
+            resp.raise_for_status()
+        return resp
+
+    def count_response_bytes(self, resp: requests.Response) -> None:
+        """учитывает в метриках прочитанное тело ответа,
+        сколько его пришло по сети
+        """
+        metrics.response_bytes_total.inc(
+            self.name, amount=get_wire_size(resp))
+
+    def http_get_json(self, url: str, params: dict = None, **kwargs):
+        """http_get с разбором ответа быстрым декодером (fast_json)
+
+        Raises:
+            requests.exceptions.InvalidJSONError: ответ не json
+        """
+        resp = self.http_get(url, params=params, **kwargs)
+        try:
+            return fast_json.loads(resp.content)
+        except ValueError as e:
+            raise requests.exceptions.InvalidJSONError(e, response=resp)
+
+    async def run_with_deadline(
+            self, deadline: Deadline,
+            func: Callable, *args,
+            timeout: float = None,
+            weight: float = None):
+        """выполняет запрос к бирже в пуле потоков,
+        не дольше timeout (по умолчанию timeout_for_get)
+        и не позже общего дедлайна.
+        Запрос ждет своей очереди в лимите биржи (rate_limiter)
+        и свободного места в пуле (get_request_slots) не дольше timeout,
+        а сам запрос получает timeout с момента, когда ему достался
+        поток.
+        Результат запроса учитывается автоматом биржи (breaker)
+        и в метриках (endpoint - имя func). Запрос, не дошедший
+        до биржи, неудачей не считается, а удачей считается только
+        тот, на который биржа ответила (exchange_answered)
+
+        Raises:
+            MarketUnavailable: биржа отключена автоматом
+            MarketTimeOut: биржа не ответила вовремя
+            RateLimited: очередь в лимите не подойдет до дедлайна
+            RequestNotSent: дедлайн кончился до отправки запроса
+        """
+        if timeout is None:
+            timeout = self.timeout_for_get
+        if weight is None:
+            weight = self.request_weight
+        # очередь в лимите и в пуле ждет не дольше самого запроса
+        if deadline is None:
+            wait_deadline = Deadline(timeout)
+        else:
+            wait_deadline = deadline.shorten(timeout)
+        endpoint = getattr(func, '__name__', 'request')
+        if wait_deadline.expired():
+            metrics.requests_total.inc(self.name, endpoint, 'not_sent')
+            raise RequestNotSent(f'time for {self.name} is out')
+        if not self.breaker.allow():
+            metrics.requests_total.inc(self.name, endpoint, 'unavailable')
+            raise MarketUnavailable(f'{self.name} is unavailable')
+        if not await self.rate_limiter.acquire(
+                weight, max_wait=wait_deadline.remaining()):
+            self.breaker.record_ignored()
+            metrics.requests_total.inc(self.name, endpoint, 'rate_limited')
+            raise RateLimited(f'rate limit of {self.name} is exhausted')
+        if wait_deadline.expired():
+            self.breaker.record_ignored()
+            metrics.requests_total.inc(self.name, endpoint, 'not_sent')
+            raise RequestNotSent(f'time for {self.name} is out')
+
+        slots = self.get_request_slots()
+        try:
+            if slots.locked():
+                await asyncio.wait_for(
+                    slots.acquire(), timeout=wait_deadline.remaining())
+            else:
+                await slots.acquire()
+        except asyncio.TimeoutError:
+            self.breaker.record_ignored()
+            metrics.requests_total.inc(self.name, endpoint, 'not_sent')
+            raise RequestNotSent(f'no free request slot for {self.name}')
+
+        loop = asyncio.get_running_loop()
+        # (дедлайн запроса, когда запрос получил поток)
+        started = loop.create_future()
+
+        def run_request():
+            started_at = time.monotonic()
+            if deadline is None:
+                request_deadline = Deadline(timeout)
+            else:
+                request_deadline = deadline.shorten(timeout)
+            # дедлайн виден внутри func через current_deadline
+            current_deadline.set(request_deadline)
+            exchange_answered.set(False)
+            loop.call_soon_threadsafe(
+                started.set_result, (request_deadline, started_at))
+            return func(*args)
+
+        def release_slot(_) -> None:
+            # место освобождается вместе с потоком: зависший запрос
+            # держит поток и после своего таймаута
+            try:
+                loop.call_soon_threadsafe(slots.release)
+            except RuntimeError:
+                # цикл событий уже закрыт
+                pass
+
+        # после запроса в context видно, ответила ли биржа
+        context = contextvars.copy_context()
+        job = self._executor.submit(context.run, run_request)
+        job.add_done_callback(release_slot)
+        started_at = None
+        outcome = 'ok'
+        try:
+            try:
+                request_deadline, started_at = await asyncio.wait_for(
+                    asyncio.shield(started),
+                    timeout=wait_deadline.remaining())
+            except asyncio.TimeoutError:
+                if job.cancel():
+                    raise RequestNotSent(
+                        f'no free thread for {self.name} request')
+                # поток достался запросу одновременно с таймаутом
+                request_deadline, started_at = await started
+            # короткий остаток общего дедлайна - не вина биржи
+            full_time = request_deadline.expires_at - started_at \
+                >= self.timeout_for_get / 2
+            result = await asyncio.wait_for(
+                asyncio.wrap_future(job),
+                timeout=request_deadline.remaining()
+            )
+        except RequestNotSent:
+            outcome = 'not_sent'
+            self.breaker.record_ignored()
+            raise
+        except (asyncio.TimeoutError, requests.exceptions.Timeout):
+            outcome = 'timeout'
+            if full_time:
+                self.on_request_failed('timeout')
+            else:
+                self.breaker.record_ignored()
+            raise MarketTimeOut(f'time for {self.name} is out')
+        except requests.exceptions.ConnectionError as e:
+            outcome = 'error'
+            self.on_request_failed(repr(e))
+            raise
+        except requests.exceptions.HTTPError as e:
+            outcome = 'error'
+            if e.response is not None and e.response.status_code >= 500:
+                self.on_request_failed(repr(e))
+            else:
+                self.breaker.record_success()
+            raise
+        except RateLimited:
+            outcome = 'rate_limited'
+            self.breaker.record_ignored()
+            raise
+        except MarketTimeOut:
+            # дедлайн прошел внутри func
+            outcome = 'timeout'
+            self.breaker.record_ignored()
+            raise
+        except Exception as e:
+            if isinstance(e, requests.exceptions.RequestException):
+                outcome = 'error'
+            else:
+                outcome = 'not_found'
+            # ответ биржи не подошел - она все же доступна
+            self.record_answer(context.get(exchange_answered))
+            raise
+        finally:
+            if started_at is not None:
+                metrics.request_seconds.observe(
+                    time.monotonic() - started_at, self.name, endpoint)
+            metrics.requests_total.inc(self.name, endpoint, outcome)
+        self.record_answer(context.get(exchange_answered))
+        return result
+
+    def record_answer(self, answered: bool) -> None:
+        """запрос закончился без ошибки связи: удача для автомата,
+        только если биржа ответила. Без ответа (данные из памяти,
+        промах по индексу) биржа тут ни при чем
+        """
+        if answered:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_ignored()
+
+    def on_request_failed(self, error: str) -> None:
+        """учитывает неудачный запрос; если биржа отключилась,
+        в фоне запускается проверка, не ожила ли она
+        """
+        was_open = self.breaker.state == CircuitBreaker.OPEN
+        self.breaker.record_failure(error)
+        if self.breaker.state != CircuitBreaker.OPEN or was_open:
+            return
+        log.warning(
+            f'{self.name} is switched off for '
+            f'{self.breaker.get_retry_in():.0f} sec: {error}')
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.ensure_future(self._probe_forever())
+
+    async def _probe_forever(self) -> None:
+        """пробные запросы к отключенной бирже, пока она не ответит"""
+        while self.breaker.state != CircuitBreaker.CLOSED:
+            # пробный запрос мог уже уйти с обычным запросом
+            await asyncio.sleep(max(self.breaker.get_retry_in(), 1))
+            try:
+                await self.run_with_deadline(None, self.probe)
+            except Exception:
+                pass
+        log.info(f'{self.name} is available again')
+
+    def probe(self) -> None:
+        """легкий запрос к бирже: любой ответ значит, что она доступна.
+        Биржи, у которых get_cup может обойтись без запроса,
+        переопределяют его
+        """
+        self.get_cup(self.probe_coin, self.usdt_coin)
+
+    async def get_cup_with_deadline(
+            self, coin: Coin,
+            base_coin: Coin,
+            depth: int = 1,
+            deadline: Deadline = None) -> Cup:
+        """get_cup в пуле потоков с дедлайном.
+        Если у биржи есть поток стаканов и его глубины хватает,
+        стакан берется из него, а пара подписывается при первом запросе.
+        Свежий стакан такой же или большей глубины берется из cup_cache
+
+        Raises:
+            MarketTimeOut: биржа не ответила вовремя
+        """
+        if self.stream is not None and depth <= self.stream_depth:
+            symbol = self.make_name_for_market(coin, base_coin)
+            cup = self.stream.get_cup(symbol, depth)
+            if cup is not None:
+                return cup
+            self.stream.subscribe(symbol)
+
+        pair = self.make_pair_key(coin, base_coin)
+        cup = self.cup_cache.get(self.name, pair, depth)
+        if cup is not None:
+            return cup
+
+        cup = await self.run_with_deadline(
+            deadline, self.get_cup, coin, base_coin, depth)
+        self.cup_cache.put(self.name, pair, depth, cup)
+        return cup
+
+    async def get_tickers_snapshot(
+            self, deadline: Deadline = None) -> Optional[Dict[str, Ticker]]:
+        """снимок тикеров биржи, один на tickers_ttl секунд.
+        Одновременные запросы ждут одну и ту же загрузку.
+
+        Returns:
+            Dict[str, Ticker]: тикеры по символу пары
+            None: биржа не умеет отдавать тикеры или загрузка не удалась
+        """
+        if not self.has_tickers:
+            return None
+        if (self._tickers_time is not None
+                and time.monotonic() - self._tickers_time < self.tickers_ttl):
+            return self._tickers
+
+        if self._tickers_task is None or self._tickers_task.done():
+            self._tickers_task = asyncio.ensure_future(
+                self.run_with_deadline(
+                    deadline, self.get_tickers,
+                    weight=self.list_request_weight))
+        try:
+            tickers = await asyncio.shield(self._tickers_task)
+        except Exception as e:
+            log.info(f'tickers from {self.name} are not loaded: {e!r}')
+            # до следующей попытки цены берутся из стаканов
+            tickers = None
+
+        self._tickers = tickers
+        self._tickers_time = time.monotonic()
+        return tickers
+
+    def make_best_price(
+            self, coin: Coin,
+            base_coin: Coin,
+            best_ask: Optional[float],
+            best_bid: Optional[float]) -> BestPrice:
+        if best_ask is None:
+            best_ask = 999_999_999_999.99
+        if best_bid is None:
+            best_bid = 0.0
+
+        return BestPrice(
+            best_ask=Price(
+                coin=coin, number=best_ask, base_coin=base_coin, market=self),
+            best_bid=Price(
+                coin=coin, number=best_bid, base_coin=base_coin, market=self)
+        )
 
-    def get_price(self, coin: Coin, base_coin: Coin) -> BestPrice:
-        """выдает цену койна в базовой валюте
+    async def get_price(
+            self, coin: Coin,
+            base_coin: Coin,
+            deadline: Deadline = None) -> BestPrice:
+        """выдает цену койна в базовой валюте.
+        Если у биржи есть снимок тикеров, цена берется из него
+        без отдельного запроса стакана
 
         Args:
             coin (Coin): монета, цена которой интересует
             base_coin (Coin): монета, в которой выражается первая монета
+            deadline (Deadline, optional): общий дедлайн цепочки запросов
 
         Raises:
             CoinNotFound: ранок не найден на бирже
+            MarketTimeOut: биржа не ответила вовремя
+                (или недавно не ответила по этой паре)
+            MarketUnavailable: биржа отключена автоматом
 
         Returns:
             BestPrice: цена на покупку и продажу
         """
+        try:
+            price = await self._find_price(coin, base_coin, deadline)
+        except CoinNotFound:
+            # ошибки соединения get_price тоже выдает как CoinNotFound
+            pair = self.make_pair_key(coin, base_coin)
+            if self.not_found.reason(pair) == NegativeCache.ERROR:
+                metrics.prices_total.inc(self.name, 'error')
+            else:
+                metrics.prices_total.inc(self.name, 'not_found')
+            raise
+        except MarketUnavailable:
+            metrics.prices_total.inc(self.name, 'unavailable')
+            raise
+        except RateLimited:
+            metrics.prices_total.inc(self.name, 'rate_limited')
+            raise
+        except MarketTimeOut:
+            metrics.prices_total.inc(self.name, 'timeout')
+            raise
+        metrics.prices_total.inc(self.name, 'found')
+        return price
+
+    async def _find_price(
+            self, coin: Coin,
+            base_coin: Coin,
+            deadline: Deadline = None) -> BestPrice:
+        """get_price без учета в метриках"""
+        if self.is_catalogue_due():
+            # список пар обновляется раз в сутки, не задерживая запрос
+            self.start_catalogue_load()
+        pair = self.make_pair_key(coin, base_coin)
         if self.coin_not_exist(coin, base_coin):
+            if self.not_found.reason(pair) == NegativeCache.TIMEOUT:
+                raise MarketTimeOut(f'time for {self.name} is out')
             raise CoinNotFound
 
+        tickers = await self.get_tickers_snapshot(deadline)
+        if tickers is not None:
+            ticker = tickers.get(self.make_name_for_market(coin, base_coin))
+            if ticker is None:
+                raise CoinNotFound
+            return self.make_best_price(
+                coin, base_coin, ticker.ask, ticker.bid)
+
         log.info(f'get price from: {self.name}')
-        signal(SIGALRM, self.handler_timeout)
-        alarm(self.timeout_for_get)
         try:
-            cup = self.get_cup(coin, base_coin)
+            cup = await self.get_cup_with_deadline(
+                coin, base_coin, deadline=deadline)
+        except (RateLimited, MarketUnavailable, RequestNotSent):
+            # пара тут ни при чем, в not_found не попадает
+            raise
         except MarketTimeOut:
-            raise MarketTimeOut
+            self.not_found.add(pair, NegativeCache.TIMEOUT)
+            raise
+        except requests.exceptions.RequestException:
+            self.not_found.add(pair, NegativeCache.ERROR)
+            raise CoinNotFound
         except Exception:
-            alarm(0)
-            self.info_non_existent_coins.append(
-                f'{coin.get_name(self)}{base_coin.get_name(self)}'
-            )
+            self.not_found.add(pair, NegativeCache.NOT_LISTED)
             raise CoinNotFound
-        alarm(0)
+        self.not_found.discard(pair)
 
-        if cup.asks:
-            best_ask = cup.asks[0].price
-        else:
-            best_ask = 999_999_999_999.99
+        return self.make_best_price(
+            coin, base_coin,
+            best_ask=cup.asks[0].price if cup.asks else None,
+            best_bid=cup.bids[0].price if cup.bids else None
+        )
 
-        if cup.bids:
-            best_bid = cup.bids[0].price
-        else:
-            best_bid = 0.0
+    async def get_prices(
+            self, coin: Coin,
+            quotes: Iterable[Coin] = None,
+            deadline: Deadline = None) -> List[BestPrice]:
+        """цены монеты сразу в нескольких базовых монетах.
+        Запросы уходят одновременно; у биржи со снимком тикеров
+        все цены берутся из одного снимка
 
-        return BestPrice(
-            best_ask=Price(
-                coin=coin, number=best_ask, base_coin=base_coin, market=self),
-            best_bid=Price(
-                coin=coin, number=best_bid, base_coin=base_coin, market=self)
-        )
+        Args:
+            coin (Coin): монета, цена которой интересует
+            quotes (Iterable[Coin], optional): базовые монеты.
+                По умолчанию plan_quotes
+            deadline (Deadline, optional): общий дедлайн цепочки запросов
 
-    def get_asks(
+        Raises:
+            CoinNotFound: ни одной пары нет на бирже
+            MarketTimeOut: цен нет, а часть пар не ответила вовремя
+                (MarketUnavailable - биржа отключена автоматом)
+
+        Returns:
+            List[BestPrice]: найденные цены, не пустой
+        """
+        if quotes is None:
+            quotes = self.plan_quotes(coin)
+        results = await asyncio.gather(
+            *[self.get_price(coin, base_coin, deadline)
+              for base_coin in quotes],
+            return_exceptions=True
+        )
+        prices = [
+            result for result in results if isinstance(result, BestPrice)]
+        if prices:
+            return prices
+
+        time_is_out = None
+        for result in results:
+            if isinstance(result, MarketTimeOut):
+                time_is_out = result
+            elif not isinstance(result, CoinNotFound):
+                raise result
+        if time_is_out is not None:
+            raise time_is_out
+        raise CoinNotFound
+
+    async def get_asks(
             self, coin: Coin,
             base_coin: Coin,
-            depth: int = 10) -> List[CupEntry]:
-        cup = self.get_cup(coin, base_coin, depth)
+            depth: int = 10,
+            deadline: Deadline = None) -> CupSide:
+        cup = await self.get_cup_with_deadline(
+            coin, base_coin, depth, deadline)
         return cup.asks
 
-    def get_bids(
+    async def get_bids(
             self, coin: Coin,
             base_coin: Coin,
-            depth: int = 10) -> List[CupEntry]:
-        cup = self.get_cup(coin, base_coin, depth)
+            depth: int = 10,
+            deadline: Deadline = None) -> CupSide:
+        cup = await self.get_cup_with_deadline(
+            coin, base_coin, depth, deadline)
         return cup.bids
 
-    # переопределить в потомках
     def make_name_for_market(self, coin: Coin, base_coin: Coin) -> str:
-        log.error('make_name_for_market from Market')
+        """имя пары в api биржи: из списка пар биржи, если он загружен"""
+        pair = self.get_pair_info(coin, base_coin)
+        if pair:
+            return pair.symbol
+        return self.format_symbol(coin, base_coin)
+
+    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
+        """ссылка на торговлю парой, для пар из списка биржи запоминается"""
+        pair = self.get_pair_info(coin, base_coin)
+        if pair and pair.link:
+            return pair.link
+        link = self.format_link(coin, base_coin)
+        if pair:
+            self.catalogue.set_link(
+                coin.get_name(self), base_coin.get_name(self), link)
+        return link
+
+    # переопределить в потомках
+    def format_symbol(self, coin: Coin, base_coin: Coin) -> str:
+        log.error('format_symbol from Market')
         return f'{coin.get_name()}_{base_coin.get_name()}'
 
+    # переопределить в потомках, у которых has_catalogue = True
+    def load_pairs(self) -> Iterable[Tuple[str, str, PairInfo]]:
+        """все пары биржи
+
+        Returns:
+            Iterable[Tuple[str, str, PairInfo]]:
+                (монета, базовая монета, PairInfo)
+        """
+        log.error('load_pairs from Market')
+        return []
+
+    # переопределить в потомках, у которых has_tickers = True
+    def get_tickers(self) -> Dict[str, Ticker]:
+        """лучшие цены по всем парам биржи одним запросом
+
+        Returns:
+            Dict[str, Ticker]: {символ пары из make_name_for_market: Ticker}
+        """
+        log.error('get_tickers from Market')
+        return {}
+
+    # переопределить в потомках, у которых есть stream_url
+    def make_subscribe_message(self, symbol: str) -> dict:
+        """сообщение подписки на стакан пары"""
+        log.error('make_subscribe_message from Market')
+        return {}
+
+    def make_unsubscribe_message(self, symbol: str) -> Optional[dict]:
+        """сообщение отписки от стакана пары, None - не нужно"""
+        return None
+
+    # переопределить в потомках, у которых есть stream_url
+    def parse_stream_message(self, data) -> Iterable[Tuple[str, Cup]]:
+        """стаканы из сообщения потока
+
+        Returns:
+            Iterable[Tuple[str, Cup]]: (символ пары, стакан),
+                пусто для служебных сообщений
+        """
+        log.error('parse_stream_message from Market')
+        return []
+
+    def decode_stream_message(self, raw):
+        return fast_json.loads(raw)
+
+    def make_stream_ping(self) -> Optional[dict]:
+        """сообщение, которое надо слать раз в BookStream.heartbeat секунд,
+        None - хватает ping websocket
+        """
+        return None
+
+    def make_stream_reply(self, data) -> Optional[dict]:
+        """ответ на служебное сообщение потока (ping), None - не нужен"""
+        return None
+
     # переопределить в потомках
     def get_cup(self, coin: Coin, base_coin: Coin, depth: int = 1) -> Cup:
         log.error('get_cup from Market')
-        return Cup(
+        return Cup.from_raw(
             [CupEntry(0.0, 0.0), CupEntry(0.0, 0.0)],
             [CupEntry(0.0, 0.0), CupEntry(0.0, 0.0)]
         )
 
     # переопределить в потомках
-    def make_link_to_market(self, coin: Coin, base_coin: Coin) -> str:
-        log.error('make_link_to_market from Market')
+    def format_link(self, coin: Coin, base_coin: Coin) -> str:
+        log.error('format_link from Market')
         return f'https://exemple.com/{coin.get_name()}_{base_coin.get_name()}'
+
+
+metrics.registry.on_scrape(Market.update_metrics)
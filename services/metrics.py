@@ -0,0 +1,273 @@
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+import math
+import threading
+
+from aiohttp import web
+
+Labels = Tuple[str, ...]
+
+# границы корзин гистограммы времени запроса, sec
+LATENCY_BUCKETS = (
+    0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+
+def format_labels(names: Labels, values: Labels) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"').replace(
+                '\n', '\\n'))
+        for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """счетчик, который только растет. Можно менять из любого потока"""
+    kind = 'counter'
+
+    def __init__(
+            self, name: str,
+            documentation: str,
+            label_names: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _match(self, labels: Dict[str, str]) -> Callable[[Labels], bool]:
+        positions = [
+            (self.label_names.index(name), value)
+            for name, value in labels.items()]
+        return lambda values: all(
+            values[position] == value for position, value in positions)
+
+    def get(self, **labels: str) -> float:
+        """сумма по всем рядам с такими значениями меток"""
+        match = self._match(labels)
+        return sum(
+            value for values, value in list(self._values.items())
+            if match(values))
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for values, value in sorted(list(self._values.items())):
+            yield (f'{self.name}{format_labels(self.label_names, values)} '
+                   f'{format_value(value)}')
+
+
+class Gauge(Counter):
+    """значение, которое выставляется перед выдачей (Registry.on_scrape)"""
+    kind = 'gauge'
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """распределение значений по корзинам, как histogram Prometheus"""
+
+    def __init__(
+            self, name: str,
+            documentation: str,
+            label_names: Labels = (),
+            buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (math.inf,)
+        # метки -> (счетчики по корзинам, сумма значений)
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = ([0] * len(self.buckets), [0.0])
+                self._series[labels] = series
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def _merge(self, labels: Dict[str, str]) -> Tuple[List[int], float]:
+        """корзины и сумма всех рядов с такими значениями меток"""
+        positions = [
+            (self.label_names.index(name), value)
+            for name, value in labels.items()]
+        counts = [0] * len(self.buckets)
+        total = 0.0
+        for values, (series_counts, series_sum) in list(
+                self._series.items()):
+            if all(values[position] == value
+                   for position, value in positions):
+                counts = [a + b for a, b in zip(counts, series_counts)]
+                total += series_sum[0]
+        return counts, total
+
+    def get_count(self, **labels: str) -> int:
+        return sum(self._merge(labels)[0])
+
+    def get_quantile(self, quantile: float, **labels: str) -> float:
+        """оценка квантиля по корзинам (как histogram_quantile),
+        nan - значений нет
+        """
+        counts, _ = self._merge(labels)
+        count = sum(counts)
+        if not count:
+            return math.nan
+        rank = quantile * count
+        seen = 0
+        lower = 0.0
+        for upper, in_bucket in zip(self.buckets, counts):
+            if in_bucket and seen + in_bucket >= rank:
+                if math.isinf(upper):
+                    # выше последней границы точнее не оценить
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            lower = upper
+        return lower
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.label_names + ('le',)
+        for values, (counts, total) in sorted(list(self._series.items())):
+            cumulative = 0
+            for upper, in_bucket in zip(self.buckets, counts):
+                cumulative += in_bucket
+                labels = format_labels(
+                    names, values + (format_value(upper),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.label_names, values)
+            yield f'{self.name}_sum{labels} {format_value(total[0])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+    """Все метрики процесса.
+    Метрики маркетов заполняются в Market.run_with_deadline, http_get
+    и get_price, а выдаются в формате Prometheus (start_server)
+    """
+
+    def __init__(self) -> None:
+        self._metrics: list = []
+        self._on_scrape: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def on_scrape(self, update: Callable[[], None]) -> None:
+        """update вызывается перед каждой выдачей (обновляет Gauge)"""
+        self._on_scrape.append(update)
+
+    def render(self) -> str:
+        for update in self._on_scrape:
+            update()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_seconds = registry.register(Histogram(
+    'market_request_seconds',
+    'Duration of requests to an exchange',
+    ('market', 'endpoint')))
+requests_total = registry.register(Counter(
+    'market_requests_total',
+    'Requests to an exchange by result: ok, not_found, error, timeout, '
+    'rate_limited, unavailable, not_sent',
+    ('market', 'endpoint', 'result')))
+http_requests_total = registry.register(Counter(
+    'market_http_requests_total',
+    'HTTP requests sent to an exchange',
+    ('market',)))
+response_bytes_total = registry.register(Counter(
+    'market_response_bytes_total',
+    'Bytes of HTTP response bodies received from an exchange, '
+    'before decompression',
+    ('market',)))
+prices_total = registry.register(Counter(
+    'market_prices_total',
+    'Price lookups (get_price) by result: found, not_found, error, '
+    'timeout, rate_limited, unavailable',
+    ('market', 'result')))
+scan_requests = registry.register(Histogram(
+    'scan_requests',
+    'Requests to exchanges made during one scan cycle',
+    buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000)))
+scan_cycle_seconds = registry.register(Histogram(
+    'scan_cycle_seconds',
+    'Duration of a scan cycle',
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300)))
+scan_overruns_total = registry.register(Counter(
+    'scan_overruns_total',
+    'Scan ticks that arrived while a cycle was still running'))
+scan_missed_total = registry.register(Counter(
+    'scan_missed_total',
+    'Scheduled scans the scheduler did not start in time'))
+scan_errors_total = registry.register(Counter(
+    'scan_errors_total',
+    'Coin checks that failed with an error'))
+scan_backlog = registry.register(Gauge(
+    'scan_backlog',
+    'Coins due for a check that did not fit into the last scan tick'))
+market_available = registry.register(Gauge(
+    'market_available',
+    'Circuit breaker of an exchange is closed (1) or not (0)',
+    ('market',)))
+rate_limit_wait_seconds = registry.register(Gauge(
+    'market_rate_limit_wait_seconds',
+    'Total time requests waited for the rate limit of an exchange',
+    ('market',)))
+stream_connected = registry.register(Gauge(
+    'market_stream_connected',
+    'Order book websocket of an exchange is connected',
+    ('market',)))
+stream_messages = registry.register(Gauge(
+    'market_stream_messages',
+    'Messages received from an order book websocket',
+    ('market',)))
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        text=registry.render(),
+        content_type='text/plain',
+        charset='utf-8'
+    )
+
+
+async def start_server(
+        host: str = '127.0.0.1', port: int = 9108) -> web.AppRunner:
+    """отдает метрики по http://host:port/metrics.
+    Остановить - await runner.cleanup()
+    """
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
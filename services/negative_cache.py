@@ -0,0 +1,87 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+import threading
+import time
+
+
+class Failure(NamedTuple):
+    reason: str
+    failures: int  # сколько раз подряд запрос не удался
+    expires_at: float
+
+
+class NegativeCache:
+    """Ограниченный кэш пар, которые не удалось получить с биржи.
+
+    Запись живет ttl, который зависит от причины неудачи
+    и растет вдвое с каждой следующей неудачей подряд (до max_ttl).
+    Когда записей больше max_size, вытесняются самые старые.
+    """
+    NOT_LISTED = 'not_listed'  # биржа ответила, но пары нет
+    ERROR = 'error'  # ошибка соединения или http
+    TIMEOUT = 'timeout'  # биржа не ответила вовремя
+
+    base_ttl = {
+        NOT_LISTED: 6 * 60 * 60,
+        ERROR: 60,
+        TIMEOUT: 15,
+    }  # sec
+    max_ttl = {
+        NOT_LISTED: 24 * 60 * 60,
+        ERROR: 60 * 60,
+        TIMEOUT: 10 * 60,
+    }  # sec
+
+    def __init__(self, max_size: int = 10_000) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._failures: OrderedDict[Hashable, Failure] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """пара недавно не нашлась и ttl записи еще не истек"""
+        if self.reason(key) is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def reason(self, key: Hashable) -> Optional[str]:
+        """причина последней неудачи, если запись еще действует"""
+        failure = self._failures.get(key)
+        if failure is None or failure.expires_at <= time.monotonic():
+            return None
+        return failure.reason
+
+    def add(self, key: Hashable, reason: str) -> None:
+        with self._lock:
+            previous = self._failures.pop(key, None)
+            if previous is not None and previous.reason == reason:
+                failures = previous.failures + 1
+            else:
+                failures = 1
+            ttl = min(
+                self.base_ttl[reason] * 2 ** (failures - 1),
+                self.max_ttl[reason]
+            )
+            self._failures[key] = Failure(
+                reason=reason,
+                failures=failures,
+                expires_at=time.monotonic() + ttl
+            )
+            while len(self._failures) > self.max_size:
+                self._failures.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        """пара снова получена - история неудач сбрасывается"""
+        with self._lock:
+            self._failures.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._failures.clear()
@@ -0,0 +1,82 @@
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+
+class Candidate(NamedTuple):
+    """пара для сделки: купить по ask_index, продать по bid_index
+    индексы - номера цен, из которых построена матрица
+    """
+    ask_index: int
+    bid_index: int
+    spread: float
+
+
+class OpportunityMatrix:
+    """Спреды между всеми маркетами и базовыми монетами по одной монете.
+
+    spreads[i, j] = bids[j] / asks[i] - 1 - доходность покупки
+    по лучшему ask i-й цены и продажи по лучшему bid j-й цены.
+    Цена с самим собой не сравнивается.
+    """
+
+    def __init__(self, asks: Sequence[float], bids: Sequence[float]) -> None:
+        self.asks = np.asarray(asks, dtype=np.float64)
+        self.bids = np.asarray(bids, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.spreads = self.bids[np.newaxis, :] / self.asks[:, np.newaxis]
+        self.spreads -= 1
+        np.fill_diagonal(self.spreads, -np.inf)
+        self.spreads[~np.isfinite(self.spreads)] = -np.inf
+
+    def __len__(self) -> int:
+        return len(self.asks)
+
+    def get_candidates(
+            self, minimal_profit: float,
+            top_k: int = None) -> List[Candidate]:
+        """пары со спредом не меньше minimal_profit, лучшие первыми"""
+        return [
+            candidate for _, candidate
+            in rank_candidates([self], minimal_profit, top_k)
+        ]
+
+
+def rank_candidates(
+        matrices: Sequence[OpportunityMatrix],
+        minimal_profit: float,
+        top_k: int = None) -> List[Tuple[int, Candidate]]:
+    """Отбирает лучшие пары сразу по нескольким монетам.
+
+    Спреды всех матриц сортируются вместе, так что top_k - общий бюджет
+    проверок глубины на весь список монет.
+
+    Args:
+        matrices (Sequence[OpportunityMatrix]): матрицы монет
+        minimal_profit (float): минимальный спред
+        top_k (int, optional): сколько пар оставить. По умолчанию все
+
+    Returns:
+        List[Tuple[int, Candidate]]: номер матрицы и пара, лучшие первыми
+    """
+    result: List[Tuple[int, Candidate]] = []
+    sizes = [matrix.spreads.size for matrix in matrices]
+    if not sum(sizes):
+        return result
+
+    spreads = np.concatenate([matrix.spreads.ravel() for matrix in matrices])
+    owners = np.repeat(np.arange(len(matrices)), sizes)
+    offsets = np.repeat(np.cumsum([0] + sizes[:-1]), sizes)
+
+    selected = np.flatnonzero(spreads >= minimal_profit)
+    selected = selected[np.argsort(-spreads[selected], kind='stable')]
+    if top_k is not None:
+        selected = selected[:top_k]
+
+    for flat_index in selected:
+        owner = owners[flat_index]
+        ask_index, bid_index = np.unravel_index(
+            flat_index - offsets[flat_index], matrices[owner].spreads.shape)
+        result.append((int(owner), Candidate(
+            int(ask_index), int(bid_index), float(spreads[flat_index]))))
+    return result
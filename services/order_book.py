@@ -0,0 +1,110 @@
+from __future__ import annotations
+from operator import neg
+from typing import Iterable, Optional
+import time
+
+import numpy as np
+from sortedcontainers import SortedDict
+
+from .cup_side import Cup, CupSide
+
+
+class SequenceGap(Exception):
+    """пропущено обновление стакана, нужен новый снимок"""
+    pass
+
+
+class LocalOrderBook:
+    """Стакан, который собирается из снимка и обновлений (diff).
+
+    Записи хранятся в SortedDict по цене, так что обновление записи
+    стоит O(log n), а лучшие N записей достаются за O(N).
+    Обновление с объемом 0 удаляет запись.
+    Номера обновлений проверяются: при пропуске apply_delta бросает
+    SequenceGap, стакан считается рассинхронизированным до нового снимка.
+    """
+
+    def __init__(self) -> None:
+        self.asks: SortedDict = SortedDict()
+        # bids по убыванию цены
+        self.bids: SortedDict = SortedDict(neg)
+        self.sequence: Optional[int] = None
+        self.synced = False
+        self.updated_at: float = None
+
+    def apply_snapshot(
+            self, asks: Iterable,
+            bids: Iterable,
+            sequence: int = None) -> None:
+        """заменяет стакан снимком: записи [цена, объем, ...]"""
+        self.asks = SortedDict(
+            (float(entry[0]), float(entry[1])) for entry in asks
+            if float(entry[1]))
+        self.bids = SortedDict(
+            neg,
+            ((float(entry[0]), float(entry[1])) for entry in bids
+             if float(entry[1])))
+        self.sequence = sequence
+        self.synced = True
+        self.updated_at = time.monotonic()
+
+    def apply_delta(
+            self, asks: Iterable,
+            bids: Iterable,
+            sequence: int = None,
+            prev_sequence: int = None) -> None:
+        """применяет обновление
+
+        Args:
+            asks, bids: измененные записи [цена, объем, ...],
+                объем 0 - записи больше нет
+            sequence (int, optional): номер обновления
+            prev_sequence (int, optional): номер предыдущего обновления,
+                если биржа его присылает. Иначе ожидается sequence - 1
+
+        Raises:
+            SequenceGap: стакан не синхронизирован или пропущено
+                обновление
+        """
+        if not self.synced:
+            raise SequenceGap('no snapshot')
+        if sequence is not None and self.sequence is not None:
+            if prev_sequence is None:
+                prev_sequence = sequence - 1
+            if sequence <= self.sequence:
+                # старое обновление, уже есть в снимке
+                return
+            if prev_sequence != self.sequence:
+                self.synced = False
+                raise SequenceGap(
+                    f'expected {self.sequence + 1}, got {sequence}')
+
+        self._update(self.asks, asks)
+        self._update(self.bids, bids)
+        self.sequence = sequence
+        self.updated_at = time.monotonic()
+
+    @staticmethod
+    def _update(side: SortedDict, entries: Iterable) -> None:
+        for entry in entries:
+            price = float(entry[0])
+            amount = float(entry[1])
+            if amount:
+                side[price] = amount
+            else:
+                side.pop(price, None)
+
+    @staticmethod
+    def get_side(side: SortedDict, depth: int) -> CupSide:
+        prices = side.keys()[:depth]
+        levels = np.empty((len(prices), 2), dtype=np.float64)
+        levels[:, 0] = prices
+        levels[:, 1] = list(map(side.__getitem__, prices))
+        return CupSide(levels)
+
+    def get_cup(self, depth: int) -> Cup:
+        """лучшие depth записей с каждой стороны"""
+        return Cup(
+            self.get_side(self.asks, depth),
+            self.get_side(self.bids, depth)
+        )
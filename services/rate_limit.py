@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+
+class RateStats:
+    """метрики ожидания лимита запросов"""
+
+    def __init__(self) -> None:
+        self.acquired = 0  # сколько запросов пропущено
+        self.delayed = 0  # сколько из них ждали своей очереди
+        # сколько не дождались бы очереди до своего дедлайна
+        self.rejected = 0
+        self.throttled = 0  # сколько раз биржа ответила 429
+        self.total_wait = 0.0  # sec
+        self.max_wait = 0.0  # sec
+
+    def get_average_wait(self) -> float:
+        if not self.acquired:
+            return 0.0
+        return self.total_wait / self.acquired
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate токенов в секунду, не больше burst.
+
+    Запрос весом weight забирает weight токенов. Если токенов не хватает,
+    токены все равно резервируются (баланс уходит в минус), а запрос ждет,
+    пока они накопятся, так что запросы проходят по очереди прихода
+    и не падают. Ждать дольше max_wait acquire отказывается.
+    Запрос тяжелее burst весит burst: иначе его очередь не подошла бы
+    никогда.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stats = RateStats()
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def get_wait(self, weight: float = 1) -> float:
+        """сколько секунд ждать запросу, если он придет сейчас"""
+        now = time.monotonic()
+        self._refill(now)
+        weight = min(weight, self.burst)
+        wait = max(0.0, (weight - self.tokens) / self.rate)
+        return max(wait, self._paused_until - now)
+
+    async def acquire(
+            self, weight: float = 1,
+            max_wait: float = None) -> bool:
+        """ждет своей очереди
+
+        Args:
+            weight (float, optional): вес запроса в лимите биржи
+            max_wait (float, optional): сколько можно ждать, sec
+
+        Returns:
+            bool: False - очередь не подойдет за max_wait, токены не взяты
+        """
+        wait = self.get_wait(weight)
+        if max_wait is not None and wait > max_wait:
+            self.stats.rejected += 1
+            return False
+
+        self.tokens -= min(weight, self.burst)
+        self.stats.acquired += 1
+        if wait > 0:
+            self.stats.delayed += 1
+            self.stats.total_wait += wait
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+            await asyncio.sleep(wait)
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """биржа ответила 429: не пускать запросы seconds секунд.
+        Можно вызывать из любого потока
+        """
+        self.stats.throttled += 1
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + seconds)
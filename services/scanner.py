@@ -0,0 +1,233 @@
+from __future__ import annotations
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Tuple
+import asyncio
+import heapq
+import logging
+import math
+import statistics
+import time
+
+from . import metrics
+from .market_base import BestPrice, Coin, Market
+
+log = logging.getLogger('business_logic')
+
+
+class ScanStats:
+    """метрики циклов сканирования"""
+
+    def __init__(self) -> None:
+        self.cycles = 0  # сколько циклов завершено
+        # тики, пришедшие во время идущего цикла (объединяются в один)
+        self.overruns = 0
+        # тики, которые планировщик не успел запустить вовремя
+        self.missed = 0
+        self.coins_checked = 0
+        self.errors = 0
+        # монеты, которым пора проверяться, но не хватило бюджета тика
+        self.backlog = 0
+        self.last_duration = 0.0  # sec
+        self.max_duration = 0.0  # sec
+        # сколько запросов к биржам ушло за последний цикл
+        self.last_requests = 0
+
+
+class CoinHeat:
+    """насколько часто стоит проверять монету"""
+
+    def __init__(self, now: float) -> None:
+        self.next_scan_at = now
+        self.interval = 0.0  # sec
+        self.last_alert_at: float = None
+        # средние цены последних проверок, для оценки волатильности
+        self.mids: Deque[float] = deque(maxlen=10)
+
+    def get_volatility(self) -> float:
+        """стандартное отклонение логарифмических изменений цены"""
+        mids = list(self.mids)
+        if len(mids) < 3:
+            return 0.0
+        changes = [math.log(b / a) for a, b in zip(mids, mids[1:])]
+        return statistics.pstdev(changes)
+
+
+class Scanner:
+    """Проверяет монеты из списка по очереди с приоритетом.
+
+    Каждая монета проверяется со своим интервалом: чем больше спред
+    между биржами, волатильность цены и чем недавнее был сигнал,
+    тем чаще. Ровные и ненайденные монеты проверяются редко.
+    За один тик проверяется не больше max_coins_per_tick монет
+    (бюджет запросов к биржам), не больше coins_in_parallel одновременно.
+
+    Циклы не пересекаются: тик, пришедший во время цикла, засчитывается
+    как overrun, и после окончания цикла запускается еще один -
+    сколько бы тиков ни пришло, они объединяются в один повторный цикл.
+    """
+    min_interval = 60  # sec
+    max_interval = 15 * 60  # sec
+    # спред и волатильность, при которых монета считается горячей
+    hot_spread = 0.02
+    hot_volatility = 0.01
+    # сколько после сигнала монета проверяется с min_interval
+    alert_cooldown = 60 * 60  # sec
+    # монета, которой пора проверяться чуть позже тика, проверяется
+    # в этом тике: иначе разброс запуска тиков откладывал бы ее
+    # на целый период планировщика
+    tick_slack = 5  # sec
+
+    def __init__(
+            self, check: Callable[[Coin], Awaitable[bool]],
+            coins_in_parallel: int = 10,
+            max_coins_per_tick: int = 20) -> None:
+        """
+        Args:
+            check (Callable): проверка одной монеты,
+                возвращает True, если по монете был сигнал
+            coins_in_parallel (int): сколько монет проверять одновременно
+            max_coins_per_tick (int): сколько монет проверять за тик
+        """
+        self.check = check
+        self.coins_in_parallel = coins_in_parallel
+        self.max_coins_per_tick = max_coins_per_tick
+        self.stats = ScanStats()
+        self._running = False
+        self._rerun = False
+        self._heat: Dict[str, CoinHeat] = {}
+        self._queue: List[Tuple[float, str]] = []
+
+    def is_running(self) -> bool:
+        return self._running
+
+    async def tick(self, get_coins: Callable[[], List[Coin]]) -> None:
+        """запускает цикл сканирования, если он еще не идет"""
+        if self._running:
+            self.stats.overruns += 1
+            metrics.scan_overruns_total.inc()
+            self._rerun = True
+            log.warning('scan cycle is still running, tick is coalesced')
+            return
+
+        self._running = True
+        try:
+            while True:
+                self._rerun = False
+                await self.run_cycle(self.pop_due_coins(get_coins()))
+                if not self._rerun:
+                    break
+        finally:
+            self._running = False
+
+    def pop_due_coins(self, coins: List[Coin]) -> List[Coin]:
+        """монеты, которым пора проверяться (с запасом tick_slack),
+        в порядке очереди
+        """
+        now = time.monotonic()
+        due_at = now + self.tick_slack
+        coins_by_name = {coin.get_name(): coin for coin in coins}
+        for name in coins_by_name:
+            if name not in self._heat:
+                self._heat[name] = CoinHeat(now)
+                heapq.heappush(self._queue, (now, name))
+        for name in list(self._heat):
+            if name not in coins_by_name:
+                del self._heat[name]
+
+        due = []
+        while self._queue and self._queue[0][0] <= due_at:
+            if len(due) >= self.max_coins_per_tick:
+                break
+            scan_at, name = heapq.heappop(self._queue)
+            heat = self._heat.get(name)
+            # монета удалена или уже перепланирована
+            if heat is None or heat.next_scan_at != scan_at:
+                continue
+            due.append(coins_by_name[name])
+        self.stats.backlog = sum(
+            1 for scan_at, _ in self._queue if scan_at <= due_at)
+        metrics.scan_backlog.set(value=self.stats.backlog)
+        return due
+
+    def count_missed(self) -> None:
+        """планировщик не успел запустить тик вовремя"""
+        self.stats.missed += 1
+        metrics.scan_missed_total.inc()
+
+    def reschedule(
+            self, coin: Coin,
+            alerted: bool,
+            cycle_started_at: float = None) -> None:
+        """планирует следующую проверку монеты. Интервал отсчитывается
+        от начала цикла, а не от конца проверки: монета с интервалом
+        в период планировщика проверяется в каждом тике
+        """
+        heat = self._heat.get(coin.get_name())
+        if heat is None:
+            return
+        now = time.monotonic()
+        if alerted:
+            heat.last_alert_at = now
+        heat.interval = self.plan_interval(
+            heat, Market.last_prices.get(coin.get_name()))
+        if cycle_started_at is None:
+            cycle_started_at = now
+        heat.next_scan_at = cycle_started_at + heat.interval
+        heapq.heappush(self._queue, (heat.next_scan_at, coin.get_name()))
+
+    def plan_interval(self, heat: CoinHeat, prices: BestPrice) -> float:
+        if (heat.last_alert_at is not None and
+                time.monotonic() - heat.last_alert_at < self.alert_cooldown):
+            return self.min_interval
+        if prices is None:
+            # монета нигде не найдена
+            return self.max_interval
+
+        ask = prices.best_ask.number
+        bid = prices.best_bid.number
+        if ask <= 0 or bid <= 0:
+            return self.max_interval
+        heat.mids.append((ask + bid) / 2)
+        spread = bid / ask - 1
+
+        hotness = (max(spread, 0.0) / self.hot_spread +
+                   heat.get_volatility() / self.hot_volatility)
+        interval = self.max_interval / (1 + 9 * hotness)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def get_interval(self, coin: Coin) -> float:
+        """текущий интервал проверки монеты (0 - еще не проверялась)"""
+        heat = self._heat.get(coin.get_name())
+        return heat.interval if heat else 0.0
+
+    async def run_cycle(self, coins: List[Coin]) -> None:
+        log.info(f'scan cycle for {len(coins)} coins is starting')
+        started_at = time.monotonic()
+        # запросы от кнопок во время цикла тоже попадут в счет
+        requests_before = metrics.request_seconds.get_count()
+        semaphore = asyncio.Semaphore(self.coins_in_parallel)
+
+        async def check_coin(coin: Coin):
+            async with semaphore:
+                alerted = False
+                try:
+                    alerted = await self.check(coin)
+                except Exception as e:
+                    self.stats.errors += 1
+                    metrics.scan_errors_total.inc()
+                    log.error(f'check {coin.get_upper_name()} failed: {e!r}')
+                self.stats.coins_checked += 1
+                self.reschedule(coin, bool(alerted), started_at)
+
+        await asyncio.gather(*[check_coin(coin) for coin in coins])
+
+        duration = time.monotonic() - started_at
+        self.stats.cycles += 1
+        self.stats.last_duration = duration
+        self.stats.max_duration = max(self.stats.max_duration, duration)
+        requests = metrics.request_seconds.get_count() - requests_before
+        self.stats.last_requests = requests
+        metrics.scan_requests.observe(requests)
+        metrics.scan_cycle_seconds.observe(duration)
+        log.info(
+            f'scan cycle ended in {duration:.1f} sec, {requests} requests')
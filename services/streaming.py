@@ -0,0 +1,156 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+
+from .cup_side import Cup
+
+if TYPE_CHECKING:
+    from .market_base import Market
+
+log = logging.getLogger('business_logic')
+
+
+class BookStream:
+    """Стаканы одной биржи по websocket.
+
+    Пара подписывается при первом запросе ее стакана (subscribe),
+    дальше стакан обновляется в памяти и get_cup отдает его без запроса
+    к бирже. После обрыва соединение восстанавливается с растущей
+    паузой и все пары подписываются заново; пока потока нет, get_cup
+    возвращает None и стакан берется через REST.
+
+    Формат сообщений задает маркет: make_subscribe_message,
+    make_unsubscribe_message, decode_stream_message, make_stream_reply,
+    parse_stream_message.
+    """
+    reconnect_delay = 1  # sec
+    max_reconnect_delay = 60  # sec
+    heartbeat = 20  # sec
+
+    def __init__(self, market: Market) -> None:
+        self.market = market
+        self.symbols: Set[str] = set()
+        self.connected = False
+        self.reconnects = 0
+        self.messages = 0
+        # символ пары -> (когда получен, стакан)
+        self._books: Dict[str, Tuple[float, Cup]] = {}
+        self._ws: aiohttp.ClientWebSocketResponse = None
+        self._task: asyncio.Task = None
+
+    def subscribe(self, symbol: str) -> None:
+        """добавляет пару в поток, запускает поток, если он не запущен"""
+        if symbol not in self.symbols:
+            self.symbols.add(symbol)
+            if self.connected:
+                asyncio.ensure_future(self._send_subscribe(self._ws, symbol))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run_forever())
+
+    def resubscribe(self, symbol: str) -> None:
+        """подписывает пару заново, чтобы получить новый снимок стакана
+        (например после пропуска обновления)
+        """
+        self._books.pop(symbol, None)
+        if self.connected:
+            asyncio.ensure_future(self._resubscribe(self._ws, symbol))
+
+    async def _resubscribe(
+            self, ws: aiohttp.ClientWebSocketResponse, symbol: str) -> None:
+        message = self.market.make_unsubscribe_message(symbol)
+        if message is not None and not ws.closed:
+            await ws.send_str(json.dumps(message))
+        await self._send_subscribe(ws, symbol)
+
+    def get_cup(self, symbol: str, depth: int) -> Optional[Cup]:
+        """стакан из потока, None - его нет или он устарел"""
+        if not self.connected or depth > self.market.stream_depth:
+            return None
+        book = self._books.get(symbol)
+        if book is None:
+            return None
+        received_at, cup = book
+        if time.monotonic() - received_at > self.market.stream_max_age:
+            return None
+        return cup.cut(depth)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self) -> None:
+        delay = self.reconnect_delay
+        while True:
+            try:
+                await self._listen()
+                delay = self.reconnect_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f'{self.market.name} stream failed: {e!r}')
+            self.reconnects += 1
+            log.info(f'{self.market.name} stream reconnects in {delay} sec')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _listen(self) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(
+                    self.market.stream_url, heartbeat=self.heartbeat) as ws:
+                self._ws = ws
+                self.connected = True
+                pinger = None
+                if self.market.make_stream_ping() is not None:
+                    pinger = asyncio.ensure_future(self._ping_forever(ws))
+                try:
+                    for symbol in list(self.symbols):
+                        await self._send_subscribe(ws, symbol)
+                    async for message in ws:
+                        if message.type in (aiohttp.WSMsgType.TEXT,
+                                            aiohttp.WSMsgType.BINARY):
+                            self._on_message(ws, message.data)
+                        elif message.type == aiohttp.WSMsgType.ERROR:
+                            raise ws.exception()
+                finally:
+                    if pinger is not None:
+                        pinger.cancel()
+                    # стаканы без потока больше не обновляются
+                    self.connected = False
+                    self._ws = None
+                    self._books.clear()
+
+    async def _ping_forever(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        """ping на уровне сообщений для бирж, которым мало ping websocket"""
+        while not ws.closed:
+            await asyncio.sleep(self.heartbeat)
+            await ws.send_str(json.dumps(self.market.make_stream_ping()))
+
+    async def _send_subscribe(
+            self, ws: aiohttp.ClientWebSocketResponse, symbol: str) -> None:
+        if ws is None or ws.closed:
+            return
+        await ws.send_str(json.dumps(
+            self.market.make_subscribe_message(symbol)))
+
+    def _on_message(
+            self, ws: aiohttp.ClientWebSocketResponse, raw) -> None:
+        self.messages += 1
+        try:
+            data = self.market.decode_stream_message(raw)
+            reply = self.market.make_stream_reply(data)
+            if reply is not None:
+                asyncio.ensure_future(ws.send_str(json.dumps(reply)))
+            for symbol, cup in self.market.parse_stream_message(data):
+                self._books[symbol] = (time.monotonic(), cup)
+        except Exception as e:
+            log.error(f'{self.market.name} stream message is broken: {e!r}')
@@ -0,0 +1,99 @@
+from typing import Dict, NamedTuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PoolStats(NamedTuple):
+    """статистика пула соединений одного хоста"""
+    connections: int  # сколько tcp соединений было открыто
+    requests: int  # сколько запросов через них ушло
+
+    @property
+    def reused(self) -> int:
+        """запросы, которые ушли по уже открытому соединению"""
+        return max(0, self.requests - self.connections)
+
+
+def get_wire_size(resp: requests.Response) -> int:
+    """сколько байт тела ответа пришло по сети (до распаковки gzip).
+    Тело ответа должно быть уже прочитано
+    """
+    tell = getattr(resp.raw, 'tell', None)
+    if tell is not None and tell():
+        return tell()
+    try:
+        return int(resp.headers['Content-Length'])
+    except (KeyError, ValueError):
+        pass
+    try:
+        return len(resp.content)
+    except RuntimeError:
+        # stream=True: тело уже прочитано и не сохранено
+        return 0
+
+
+class HttpTransport:
+    """Общий http клиент для всех маркетов.
+    Держит keep-alive соединения в пуле для каждого хоста,
+    чтобы не платить за tcp+tls рукопожатие на каждый запрос.
+    Ответы в gzip/deflate распаковываются автоматически.
+    """
+
+    def __init__(
+            self, pool_connections: int = 32,
+            pool_maxsize: int = 20) -> None:
+        """
+        Args:
+            pool_connections (int): для скольких хостов хранить пулы
+            pool_maxsize (int): сколько соединений держать к одному хосту
+        """
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+        # хост биржи -> адрес, на который уходят его запросы
+        self.redirects: Dict[str, str] = {}
+
+    def redirect(self, host: str, base_url: str) -> None:
+        """запросы к host уходят на base_url (например на локальный
+        стенд вместо биржи, см. benchmarks/scan.py)
+        """
+        self.redirects[host] = base_url.rstrip('/')
+
+    def get(
+            self, url: str,
+            params: dict = None,
+            timeout: float = None,
+            **kwargs) -> requests.Response:
+        if self.redirects:
+            parts = urlsplit(url)
+            if parts.netloc in self.redirects:
+                url = self.redirects[parts.netloc] + parts.path
+                if parts.query:
+                    url += f'?{parts.query}'
+        return self.session.get(
+            url, params=params, timeout=timeout, **kwargs)
+
+    def get_stats(self) -> Dict[str, PoolStats]:
+        """статистика переиспользования соединений по хостам"""
+        pools = self._adapter.poolmanager.pools
+        stats = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[pool.host] = PoolStats(
+                connections=pool.num_connections,
+                requests=pool.num_requests
+            )
+        return stats
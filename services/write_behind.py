@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import threading
+
+import transaction
+
+log = logging.getLogger('business_logic')
+
+
+class WriteBehind:
+    """Отложенное сохранение изменений в ZODB.
+
+    Изменения копятся и сохраняются одним commit не реже чем раз
+    в interval секунд или сразу, когда их набирается batch_size.
+    Commit выполняется в отдельном потоке, чтобы fsync не блокировал
+    event loop. Изменять сохраняемые объекты нужно под lock.
+    Вне event loop (скрипты, потоки пула) commit делается сразу.
+    """
+
+    def __init__(
+            self, manager: transaction.TransactionManager,
+            interval: float = 2.0,
+            batch_size: int = 50) -> None:
+        """
+        Args:
+            manager (TransactionManager): менеджер транзакций соединения
+            interval (float): не дольше скольких секунд копить изменения
+            batch_size (int): сколько изменений сохранять одним commit
+        """
+        self.manager = manager
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.pending = 0
+        self._timer: asyncio.TimerHandle = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='coin-db')
+
+    def mark_dirty(self) -> None:
+        """запомнить, что есть несохраненное изменение"""
+        with self.lock:
+            self.pending += 1
+            pending = self.pending
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        if pending >= self.batch_size:
+            self._schedule_commit(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(
+                self.interval, self._schedule_commit, loop)
+
+    def _schedule_commit(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop.run_in_executor(self._executor, self.flush)
+
+    def flush(self) -> None:
+        """сохраняет все накопленные изменения (например при выключении)"""
+        with self.lock:
+            if self.pending == 0:
+                return
+            count = self.pending
+            self.pending = 0
+            try:
+                self.manager.commit()
+            except Exception as e:
+                log.error(f'coins are not saved: {e!r}')
+                self.manager.abort()
+                return
+        log.info(f'saved {count} coin changes')
@@ -0,0 +1,239 @@
+import asyncio
+import gzip
+import json
+import logging
+import time
+
+from aiohttp import web, WSMsgType
+
+from services.market_base import Market, Coin, Cup
+from services.api_bybit import ByBit
+from services.api_gate import Gate
+from services.api_huobi import Huobi
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger('stream_test')
+
+btc_coin = Coin(name='btc')
+
+rest_cup = Cup.from_raw([['101', '1']], [['99', '1']])
+stream_asks = [['100.5', '2'], ['100.6', '3']]
+stream_bids = [['100.4', '4'], ['100.3', '5']]
+
+
+class StandIn:
+    """websocket сервер вместо биржи: на подписку отвечает стаканом,
+    drop() разрывает все соединения
+    """
+
+    def __init__(self, gzip_messages: bool = False) -> None:
+        self.gzip_messages = gzip_messages
+        self.subscriptions = []
+        self.unsubscriptions = []
+        self.pongs = []
+        self._sockets = []
+
+    async def send(self, ws: web.WebSocketResponse, data: dict) -> None:
+        if self.gzip_messages:
+            await ws.send_bytes(gzip.compress(json.dumps(data).encode()))
+        else:
+            await ws.send_str(json.dumps(data))
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.append(ws)
+        if self.gzip_messages:
+            await self.send(ws, {'ping': 1})
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(message.data)
+            if 'pong' in data:
+                self.pongs.append(data['pong'])
+            elif 'sub' in data:
+                # huobi
+                self.subscriptions.append(data['sub'])
+                await self.send(ws, {
+                    'ch': data['sub'], 'ts': 1,
+                    'tick': {'asks': stream_asks, 'bids': stream_bids}})
+            elif data.get('op') == 'unsubscribe':
+                self.unsubscriptions.append(data['args'][0])
+            elif data.get('op') == 'subscribe':
+                # bybit: снимок, изменения, а в первый раз еще и пропуск
+                topic = data['args'][0]
+                symbol = topic.split('.')[-1]
+                self.subscriptions.append(topic)
+                book = {'s': symbol, 'a': stream_asks, 'b': stream_bids}
+                await self.send(ws, {
+                    'topic': topic, 'type': 'snapshot',
+                    'data': {**book, 'u': 1}})
+                await self.send(ws, {
+                    'topic': topic, 'type': 'delta',
+                    'data': {'s': symbol, 'u': 2,
+                             'a': [['100.5', '0'], ['100.7', '1']],
+                             'b': [['100.45', '1']]}})
+                if len(self.subscriptions) == 1:
+                    await self.send(ws, {
+                        'topic': topic, 'type': 'delta',
+                        'data': {'s': symbol, 'u': 4, 'a': [], 'b': []}})
+            elif data.get('event') == 'subscribe':
+                # gate
+                symbol = data['payload'][0]
+                self.subscriptions.append(symbol)
+                await self.send(ws, {
+                    'channel': 'spot.order_book', 'event': 'update',
+                    'result': {
+                        's': symbol, 'asks': stream_asks,
+                        'bids': stream_bids}})
+        return ws
+
+    async def drop(self) -> None:
+        for ws in self._sockets:
+            await ws.close()
+        self._sockets.clear()
+
+
+async def start_stand_in(stand_in: StandIn) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/ws', stand_in.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner
+
+
+def local_market(market_class: type, url: str) -> Market:
+    """маркет, который ходит в поток stand-in, а REST не трогает"""
+
+    class LocalMarket(market_class):
+        stream_url = url
+        rest_calls = 0
+
+        def get_cup(self, coin, base_coin, depth=1):
+            self.rest_calls += 1
+            return rest_cup
+
+    LocalMarket.__name__ = f'Local{market_class.__name__}'
+    return LocalMarket()
+
+
+async def wait_for(condition, timeout: float = 5) -> bool:
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < timeout:
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+async def check_market(
+        market_class: type, gzip_messages: bool = False) -> None:
+    print('------')
+    stand_in = StandIn(gzip_messages)
+    runner = await start_stand_in(stand_in)
+    port = runner.addresses[0][1]
+    market = local_market(market_class, f'http://127.0.0.1:{port}/ws')
+    symbol = market.make_name_for_market(btc_coin, Market.usdt_coin)
+    Market.cup_cache.clear()
+
+    cup = await market.get_cup_with_deadline(
+        btc_coin, Market.usdt_coin, depth=2)
+    if cup == rest_cup and market.rest_calls == 1:
+        log.info(f'{market.name}: no stream yet, cup from REST')
+    else:
+        log.error(f'{market.name}: first cup is not from REST')
+
+    if await wait_for(lambda: market.stream.get_cup(symbol, 2) is not None):
+        log.info(f'{market.name}: book received from stream')
+    else:
+        log.error(f'{market.name}: stream book is not received')
+
+    started_at = time.perf_counter()
+    cup = await market.get_cup_with_deadline(
+        btc_coin, Market.usdt_coin, depth=2)
+    duration = time.perf_counter() - started_at
+    if cup.asks[0].price == 100.5 and market.rest_calls == 1:
+        log.info(f'{market.name}: cup from memory in {duration * 1e6:.0f} us')
+    else:
+        log.error(f'{market.name}: cup is not from stream')
+
+    if gzip_messages:
+        if await wait_for(lambda: stand_in.pongs):
+            log.info(f'{market.name}: ping answered')
+        else:
+            log.error(f'{market.name}: ping is not answered')
+
+    await stand_in.drop()
+    if await wait_for(lambda: not market.stream.connected):
+        Market.cup_cache.clear()
+        cup = await market.get_cup_with_deadline(
+            btc_coin, Market.usdt_coin, depth=1)
+        if market.rest_calls == 2:
+            log.info(f'{market.name}: stream is down, fallback to REST')
+        else:
+            log.error(f'{market.name}: no fallback to REST')
+
+    if await wait_for(lambda: len(stand_in.subscriptions) == 2 and
+                      market.stream.get_cup(symbol, 2) is not None):
+        log.info(f'{market.name}: resubscribed after reconnect')
+    else:
+        log.error(f'{market.name}: not resubscribed after reconnect')
+
+    # стакан глубже потока: только REST, новая пара не подписывается
+    rest_calls = market.rest_calls
+    await market.get_cup_with_deadline(
+        Coin(name='eth'), Market.usdt_coin, depth=market.stream_depth + 1)
+    await asyncio.sleep(0.1)
+    if market.rest_calls == rest_calls + 1 and \
+            len(stand_in.subscriptions) == 2:
+        log.info(f'{market.name}: deep cup from REST, not subscribed')
+    else:
+        log.error(f'{market.name}: deep cup is subscribed to the stream')
+
+    await market.stream.stop()
+    await runner.cleanup()
+    Market.all_markets.remove(market)
+
+
+async def check_order_book_diffs() -> None:
+    print('------')
+    stand_in = StandIn()
+    runner = await start_stand_in(stand_in)
+    port = runner.addresses[0][1]
+    market = local_market(ByBit, f'http://127.0.0.1:{port}/ws')
+    symbol = market.make_name_for_market(btc_coin, Market.usdt_coin)
+    Market.cup_cache.clear()
+
+    await market.get_cup_with_deadline(btc_coin, Market.usdt_coin, depth=3)
+    if await wait_for(lambda: stand_in.unsubscriptions):
+        log.info(f'{market.name}: sequence gap, resubscribed')
+    else:
+        log.error(f'{market.name}: sequence gap is not noticed')
+
+    if await wait_for(lambda: market.stream.get_cup(symbol, 3) is not None):
+        cup = market.stream.get_cup(symbol, 3)
+        # снимок + изменение: 100.5 удален, добавлены 100.7 и 100.45
+        if ([entry.price for entry in cup.asks] == [100.6, 100.7] and
+                [entry.price for entry in cup.bids] == [100.45, 100.4, 100.3]):
+            log.info(f'{market.name}: diffs are applied to the book')
+        else:
+            log.error(f'{market.name}: wrong book after diffs: {cup}')
+    else:
+        log.error(f'{market.name}: book is not resynced')
+
+    await market.stream.stop()
+    await runner.cleanup()
+    Market.all_markets.remove(market)
+
+
+async def test_streams():
+    await check_market(Gate)
+    await check_market(Huobi, gzip_messages=True)
+    await check_order_book_diffs()
+
+
+if __name__ == '__main__':
+    asyncio.run(test_streams())